@@ -0,0 +1,210 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from imaging import prepare_image
+from menu_index import MenuIndex
+from recognition import label_request, labels_from_response, match_dish, name_dish
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+VISION_MAX_BATCH = 16
+
+# (id, path) pairs from a directory (recursively) or a manifest: .jsonl with {"id", "path"} per line,
+# or plain text with one path per line. Relative manifest paths resolve against the manifest's folder.
+def discover_images(source):
+    if os.path.isdir(source):
+        found = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    path = os.path.join(root, name)
+                    found.append((os.path.relpath(path, source), path))
+        return sorted(found)
+    base = os.path.dirname(os.path.abspath(source))
+    found = []
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if source.endswith(".jsonl"):
+                entry = json.loads(line)
+                path = entry["path"]
+                image_id = entry.get("id", path)
+            else:
+                path = image_id = line
+            found.append((image_id, path if os.path.isabs(path) else os.path.join(base, path)))
+    return found
+
+# Ids already in the output, so a rerun resumes where the last one stopped. Failed ids count as done
+# too (their error row is already there) unless retry_errors is set.
+def completed_ids(output_path, retry_errors=False):
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            if row.get("status") == "ok" or not retry_errors:
+                done.add(row["id"])
+    return done
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _recognize(model, index, menu_items, image_id, path, labels, match_options, memo):
+    started = time.perf_counter()
+    dish_name = name_dish(model, labels, memo)
+    match, message, confidence = match_dish(model, index, dish_name, menu_items, **match_options) if menu_items else (None, "No menu provided.", 0.0)
+    return {
+        "id": image_id,
+        "path": path,
+        "status": "ok",
+        "labels": [label for label, _ in labels],
+        "dish": dish_name,
+        "match": match["name"] if match else None,
+        "match_id": match.get("id") if match else None,
+        "message": message,
+        "confidence": round(confidence, 4),
+        "gemini_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+# Recognize every image and append one JSON line per image to output_path. Vision labels are fetched
+# with batch_annotate_images (up to 16 images per request) while earlier images are still being named
+# and matched on a bounded Gemini worker pool. Images already in the output are skipped; with
+# retry_errors, images whose rows are all errors are tried again (the new row supersedes the old ones).
+# An optional LabelMemo lets repeated label sets skip the Gemini naming call.
+def run_batch(images, vision_client, model, menu_items, output_path, batch_size=VISION_MAX_BATCH,
+              concurrency=8, max_edge=1600, match_options=None, memo=None, retry_errors=False):
+    match_options = match_options or {}
+    index = MenuIndex(menu_items) if menu_items else None
+    done = completed_ids(output_path, retry_errors)
+    pending = [(image_id, path) for image_id, path in images if image_id not in done]
+    summary = {"total": len(images), "skipped": len(images) - len(pending), "ok": 0, "error": 0}
+    started = time.perf_counter()
+    logger.info("Batch: %d images, %d already done, %d to process", len(images), summary["skipped"], len(pending))
+
+    with open(output_path, "a", encoding="utf-8") as output, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = set()
+
+        def write(row):
+            output.write(json.dumps(row) + "\n")
+            output.flush()
+            summary[row["status"]] += 1
+
+        def drain(limit):
+            nonlocal in_flight
+            while len(in_flight) > limit:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    write(future.result())
+
+        def recognize_safely(image_id, path, labels):
+            try:
+                return _recognize(model, index, menu_items, image_id, path, labels, match_options, memo)
+            except Exception as e:
+                return {"id": image_id, "path": path, "status": "error", "labels": [label for label, _ in labels], "error": f"Error recognizing dish: {str(e)}"}
+
+        for chunk in _chunks(pending, min(batch_size, VISION_MAX_BATCH)):
+            requests = []
+            readable = []
+            for image_id, path in chunk:
+                try:
+                    with open(path, "rb") as f:
+                        requests.append(label_request(prepare_image(f.read(), max_edge=max_edge).content))
+                    readable.append((image_id, path))
+                except Exception as e:
+                    write({"id": image_id, "path": path, "status": "error", "error": f"Error reading image: {str(e)}"})
+            if not requests:
+                continue
+            try:
+                responses = vision_client.batch_annotate_images(requests=requests).responses
+            except Exception as e:
+                for image_id, path in readable:
+                    write({"id": image_id, "path": path, "status": "error", "error": f"Error detecting dish: {str(e)}"})
+                continue
+            for (image_id, path), response in zip(readable, responses):
+                if response.error.message:
+                    write({"id": image_id, "path": path, "status": "error", "error": f"Error detecting dish: {response.error.message}"})
+                    continue
+                in_flight.add(pool.submit(recognize_safely, image_id, path, labels_from_response(response)))
+            # Keep Vision at most a couple of batches ahead of Gemini
+            drain(concurrency * 2)
+        drain(0)
+
+    elapsed = time.perf_counter() - started
+    summary["seconds"] = round(elapsed, 2)
+    summary["images_per_second"] = round((summary["ok"] + summary["error"]) / elapsed, 2) if elapsed else 0.0
+    logger.info("Batch finished: %s", summary)
+    return summary
+
+# Rewrite a JSONL result file as Parquet, one row per image (the latest), needs pyarrow or fastparquet
+def export_parquet(jsonl_path, parquet_path):
+    import pandas as pd
+    results = pd.read_json(jsonl_path, lines=True, dtype={"id": str})
+    results.drop_duplicates(subset="id", keep="last").to_parquet(parquet_path, index=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recognize dishes in many images without the Streamlit UI.")
+    parser.add_argument("source", help="Directory of images, or a manifest (.jsonl with id/path, or one path per line)")
+    parser.add_argument("--output", default="recognition.jsonl", help="JSONL results file; reruns resume from it")
+    parser.add_argument("--parquet", help="Also write the results to this Parquet file when done")
+    parser.add_argument("--secrets", default=os.path.join(".streamlit", "secrets.toml"), help="Path to secrets.toml with API credentials")
+    parser.add_argument("--menu", help="Menu JSON file (list of items); defaults to the Firestore menu collection")
+    parser.add_argument("--no-match", action="store_true", help="Only detect dishes, skip menu matching")
+    parser.add_argument("--batch-size", type=int, default=VISION_MAX_BATCH)
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent Gemini calls")
+    parser.add_argument("--max-edge", type=int, default=1600)
+    parser.add_argument("--vision-rate", type=float, default=10, help="Vision requests per second")
+    parser.add_argument("--gemini-rate", type=float, default=5, help="Gemini requests per second")
+    parser.add_argument("--retry-errors", action="store_true", help="Retry images whose earlier attempts failed")
+    parser.add_argument("--label-memo", help="SQLite file for the label-set memo shared with the app (e.g. .cache/app_cache.sqlite3)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    from cache import DiskCache, LabelMemo
+    from clients import Clients
+    from engine import load_secrets
+    from gateway import Gateway
+    from menu_store import MenuStore
+    secrets = load_secrets(args.secrets)
+    gateway = Gateway({
+        "vision": (args.vision_rate, args.vision_rate, args.concurrency),
+        "gemini": (args.gemini_rate, args.gemini_rate, args.concurrency)
+    })
+    clients = Clients(secrets["GOOGLE_CLOUD_VISION_CREDENTIALS"], secrets["FIREBASE_CREDENTIALS"], secrets["GEMINI"]["api_key"], gateway=gateway)
+    if args.no_match:
+        menu_items = []
+    elif args.menu:
+        with open(args.menu, encoding="utf-8") as f:
+            menu_items = json.load(f)
+    else:
+        menu_items = list(MenuStore(clients.db, listen=False).items())
+    summary = run_batch(
+        discover_images(args.source),
+        clients.vision,
+        clients.gemini,
+        menu_items,
+        args.output,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        max_edge=args.max_edge,
+        retry_errors=args.retry_errors,
+        memo=LabelMemo(DiskCache(args.label_memo, namespace="label_memo", max_entries=20000)) if args.label_memo else None
+    )
+    if args.parquet:
+        export_parquet(args.output, args.parquet)
+    print(json.dumps(summary))
+    return 0 if summary["error"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
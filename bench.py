@@ -0,0 +1,292 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fakes import FakeFirestore, FakeGenerativeModel, FakeVisionClient, Latency, synthetic_images, synthetic_menu
+from gateway import GatedModel, GatedVision, Gateway
+from imaging import prepare_image
+from llm import stream_to
+from menu_frame import MenuFrame
+from menu_index import MenuIndex, fit_to_budget
+from menu_store import MenuStore
+from recognition import label_image, match_dish, name_dish
+from resilience import Deadline, deadline_scope
+
+logger = logging.getLogger(__name__)
+
+MENU_LOAD_ATTEMPTS = 5
+
+PREFERENCE_SETS = [[], ["Vegan"], ["Vegetarian", "Gluten-Free"], ["Keto"], ["Dairy-Free", "Low-Sugar"], ["Vegan", "Gluten-Free", "Keto"]]
+THEMES = ["Italian", "Mexican", "Asian", "Desserts", "Healthy"]
+
+# Nearest-rank percentile of a list of seconds, in milliseconds
+def percentile_ms(samples, p):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))] * 1000, 2)
+
+# Per-stage durations and errors, shared by the worker threads of one run
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def time(self, stage, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.errors[stage] = self.errors.get(stage, 0) + 1
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def report(self, requests, seconds):
+        return {
+            "requests": requests,
+            "seconds": round(seconds, 3),
+            "throughput_rps": round(requests / seconds, 2) if seconds else None,
+            "stages": {
+                stage: {
+                    "count": len(samples),
+                    "errors": self.errors.get(stage, 0),
+                    "p50_ms": percentile_ms(samples, 50),
+                    "p95_ms": percentile_ms(samples, 95),
+                    "p99_ms": percentile_ms(samples, 99)
+                }
+                for stage, samples in sorted(self.samples.items())
+            }
+        }
+
+def _run_concurrently(fn, count, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started = time.perf_counter()
+        outcomes = list(pool.map(fn, range(count)))
+    return outcomes, time.perf_counter() - started
+
+def build_gateway(args):
+    return Gateway(
+        {
+            "vision": (args.vision_rate, args.vision_rate, args.api_concurrency),
+            "gemini": (args.gemini_rate, args.gemini_rate, args.api_concurrency)
+        },
+        max_workers=max(16, args.api_concurrency * 2)
+    )
+
+# The recognition steps the app's engine performs, called one after another through the shared gateway:
+# prepare the upload, label it, name the dish, match it against the menu and stream recommendations,
+# each request under its own deadline. The app's caches and its concurrent pipeline are deliberately
+# left out, so every request measures the uncached path step by step.
+def bench_recognition(args, menu_items, images, concurrency):
+    gateway = build_gateway(args)
+    vision_client = GatedVision(FakeVisionClient([item["name"] for item in menu_items], latency(args, "vision")), gateway)
+    model = GatedModel(FakeGenerativeModel(latency(args, "gemini"), latency(args, "chunk")), gateway)
+    index = MenuIndex(menu_items)
+    timer = StageTimer()
+
+    def request(i):
+        image = images[i % len(images)]
+        preferences = PREFERENCE_SETS[i % len(PREFERENCE_SETS)]
+        started = time.perf_counter()
+        try:
+            with deadline_scope(Deadline(args.request_timeout)):
+                prepared = timer.time("prepare_image", prepare_image, image, max_edge=args.max_edge)
+                labels = timer.time("vision", label_image, vision_client, prepared.content)
+                dish_name = timer.time("name_dish", name_dish, model, labels)
+                timer.time("match_dish", match_dish, model, index, dish_name, menu_items)
+                def recommend():
+                    lines = fit_to_budget(
+                        [f"- {item['name']}: {item.get('description', '')}" for item in index.retrieve(dish_name, preferences, k=args.top_k)],
+                        args.token_budget
+                    )
+                    return stream_to(model, "Recommend up to 3 dishes from:\n" + "\n".join(lines), executor=gateway)
+                timer.time("recommend", recommend)
+            ok = True
+        except Exception as e:
+            logger.debug("Request %d failed: %s", i, e)
+            ok = False
+        timer.record("request", time.perf_counter() - started)
+        return ok
+
+    outcomes, seconds = _run_concurrently(request, args.requests, concurrency)
+    report = timer.report(len(outcomes), seconds)
+    report["failed_requests"] = outcomes.count(False)
+    report["gateway"] = {key: value for key, value in gateway.stats().items() if key in ("calls", "hedged", "deduplicated", "circuits")}
+    gateway.pool.shutdown(wait=False)
+    gateway.hedge_pool.shutdown(wait=False)
+    return report
+
+# Menu paths: the initial Firestore load and a delta refresh, index and frame builds, then concurrent
+# matching searches, prompt retrieval and dietary filtering. Injected Firestore failures are counted as
+# stage errors: the initial load is retried a few times, a failed refresh keeps the loaded menu.
+def bench_menu(args, menu_items, concurrency):
+    timer = StageTimer()
+    db = FakeFirestore(menu_items, latency(args, "firestore"))
+    store = None
+    for _ in range(MENU_LOAD_ATTEMPTS):
+        try:
+            store = timer.time("fetch_menu", MenuStore, db, listen=False, refresh_interval=3600)
+            break
+        except Exception as e:
+            logger.debug("Menu load failed: %s", e)
+    if store is None:
+        report = timer.report(0, 0.0)
+        report["failed_requests"] = args.requests
+        return report
+    db.touch(menu_items[0]["id"], description="Updated description")
+    try:
+        timer.time("refresh_menu", store.refresh)
+    except Exception as e:
+        logger.debug("Menu refresh failed: %s", e)
+    snapshot = store.items()
+    index = timer.time("build_index", MenuIndex, snapshot)
+    frame = timer.time("build_frame", MenuFrame, snapshot)
+    # Menu names with a letter dropped, like a recognized dish that is close to but not exactly on the menu
+    rng = random.Random(args.seed)
+    queries = [rng.choice(snapshot)["name"].lower().replace("a", "", 1) for _ in range(args.requests)]
+
+    def request(i):
+        preferences = PREFERENCE_SETS[i % len(PREFERENCE_SETS)]
+        timer.time("search", index.search, queries[i], 10)
+        timer.time("retrieve", index.retrieve, queries[i], preferences, None, args.top_k)
+        timer.time("theme_retrieve", index.retrieve, None, preferences, THEMES[i % len(THEMES)], args.top_k)
+        timer.time("filter", frame.rows, preferences)
+        timer.time("display", frame.display, preferences, "Regular", None)
+        return True
+
+    outcomes, seconds = _run_concurrently(request, args.requests, concurrency)
+    return timer.report(len(outcomes), seconds)
+
+FAKE_SERVICES = ["vision", "gemini", "chunk", "firestore"]
+
+def latency(args, name):
+    median, sigma = getattr(args, f"{name}_latency")
+    failure_rate = 0.0 if name == "chunk" else args.failure_rate
+    return Latency(median, sigma, failure_rate=failure_rate, scale=args.latency_scale, seed=args.seed * len(FAKE_SERVICES) + FAKE_SERVICES.index(name))
+
+# Stages whose p50 moved past `tolerance` (and past the baseline's own p95, so ordinary run-to-run
+# spread never counts) or whose p95 moved past `tail_tolerance` relative to the baseline, and runs whose
+# throughput dropped past `tolerance`. With a few dozen samples under thread contention the tail is
+# noisy, hence the looser tail bound. Differences under min_delta_ms are treated
+# as noise, stages with fewer than min_samples samples on either side (one-shot setup like build_index)
+# are reported but not gated, and throughput is only gated for runs that took at least min_run_seconds.
+def compare(results, baseline, tolerance, min_delta_ms, min_samples=20, min_run_seconds=1.0, tail_tolerance=1.0):
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get("results", {}).get(key)
+        if not previous:
+            continue
+        long_enough = min(current["seconds"], previous.get("seconds", 0)) >= min_run_seconds
+        if long_enough and previous.get("throughput_rps") and current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{key}: throughput {current['throughput_rps']} rps < baseline {previous['throughput_rps']} rps")
+        for stage, stats in current["stages"].items():
+            before = previous["stages"].get(stage)
+            if not before or before["p95_ms"] is None or stats["p95_ms"] is None:
+                continue
+            if min(stats["count"], before["count"]) < min_samples:
+                continue
+            for name, allowed, floor in (("p50", tolerance, before["p95_ms"]), ("p95", tail_tolerance, 0)):
+                now, then = stats[f"{name}_ms"], before[f"{name}_ms"]
+                if now > max(then * (1 + allowed), floor) and now - then > min_delta_ms:
+                    regressions.append(f"{key} {stage}: {name} {now} ms > baseline {then} ms")
+    return regressions
+
+def print_results(results, out=sys.stdout):
+    for key, report in results.items():
+        failed = report.get("failed_requests")
+        print(f"\n{key}: {report['requests']} requests in {report['seconds']}s, {report['throughput_rps']} rps" + (f", {failed} failed" if failed else ""), file=out)
+        print(f"  {'stage':<16}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}", file=out)
+        for stage, stats in report["stages"].items():
+            print(f"  {stage:<16}{stats['count']:>7}{stats['errors']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}", file=out)
+
+def _pair(text):
+    median, _, sigma = text.partition(",")
+    return float(median), float(sigma or 0.5)
+
+def _ints(text):
+    return [int(value) for value in text.split(",") if value]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the recognition and menu pipelines against local fakes of Vision, Gemini and Firestore.")
+    parser.add_argument("--scenarios", default="recognition,menu", help="Comma-separated: recognition, menu")
+    parser.add_argument("--menu-sizes", type=_ints, default=[10, 100, 1000, 10000])
+    parser.add_argument("--concurrency", type=_ints, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=32, help="Requests per run")
+    parser.add_argument("--images", type=int, default=8, help="Distinct synthetic images")
+    parser.add_argument("--vision-latency", type=_pair, default=(0.15, 0.4), help="Median seconds[,sigma] of the fake Vision calls")
+    parser.add_argument("--gemini-latency", type=_pair, default=(0.4, 0.5), help="Median seconds[,sigma] to a Gemini answer or first chunk")
+    parser.add_argument("--chunk-latency", type=_pair, default=(0.03, 0.3), help="Median seconds[,sigma] between streamed chunks")
+    parser.add_argument("--firestore-latency", type=_pair, default=(0.05, 0.3), help="Median seconds[,sigma] of a Firestore query")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of fake API calls that fail with ServiceUnavailable")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiply every fake latency (0 measures local work only)")
+    parser.add_argument("--vision-rate", type=float, default=1000, help="Gateway Vision requests per second")
+    parser.add_argument("--gemini-rate", type=float, default=1000, help="Gateway Gemini requests per second")
+    parser.add_argument("--api-concurrency", type=int, default=32, help="Gateway concurrent calls per API")
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--max-edge", type=int, default=1600)
+    parser.add_argument("--top-k", type=int, default=25)
+    parser.add_argument("--token-budget", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the full JSON report here")
+    parser.add_argument("--baseline", default="bench_baseline.json", help="Baseline report to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative slowdown of a stage's p50 (and of throughput)")
+    parser.add_argument("--tail-tolerance", type=float, default=1.0, help="Allowed relative slowdown of a stage's p95")
+    parser.add_argument("--min-delta-ms", type=float, default=10.0, help="Ignore differences smaller than this")
+    parser.add_argument("--min-samples", type=int, default=20, help="Only gate stages with at least this many samples")
+    parser.add_argument("--min-run-seconds", type=float, default=1.0, help="Only gate throughput of runs at least this long")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    images = synthetic_images(args.images, seed=args.seed) if "recognition" in scenarios else []
+    results = {}
+    for size, concurrency in itertools.product(args.menu_sizes, args.concurrency):
+        menu_items = synthetic_menu(size, seed=args.seed)
+        if "recognition" in scenarios:
+            results[f"recognition/menu={size}/c={concurrency}"] = bench_recognition(args, menu_items, images, concurrency)
+        if "menu" in scenarios:
+            results[f"menu/menu={size}/c={concurrency}"] = bench_menu(args, menu_items, concurrency)
+
+    # Round-tripped through JSON so it compares equal to a stored baseline's config
+    config = json.loads(json.dumps({key: value for key, value in vars(args).items() if key not in ("output", "baseline", "save_baseline", "tolerance", "tail_tolerance", "min_delta_ms", "min_samples", "min_run_seconds")}))
+    report = {"config": config, "python": platform.python_version(), "machine": platform.machine(), "results": results}
+    print_results(results)
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        differing = sorted(key for key in config if baseline.get("config", {}).get(key, config[key]) != config[key] and key not in ("scenarios", "menu_sizes", "concurrency"))
+        if differing:
+            print(f"\nNote: baseline was recorded with different settings ({', '.join(differing)}); comparisons may be skewed")
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms, args.min_samples, args.min_run_seconds, args.tail_tolerance)
+        print(f"\n{len(regressions)} regression(s) against {args.baseline}")
+        for regression in regressions:
+            print(f"  {regression}")
+    report["regressions"] = regressions
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from PIL import Image
+
+# Persistent key/value store (SQLite) with size-bounded LRU and TTL eviction
+class DiskCache:
+    def __init__(self, path, namespace="default", max_entries=1000, ttl=None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, fingerprint TEXT, "
+            "created REAL NOT NULL, accessed REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (namespace, accessed)")
+        self._conn.commit()
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key, record_miss=True):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row and self._expired(row[1], now):
+                self._conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (self.namespace, key))
+                self._conn.commit()
+                self.evictions += 1
+                row = None
+            if not row:
+                if record_miss:
+                    self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET accessed = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    # Closest entry whose fingerprint is within max_distance bits of the given one
+    def get_similar(self, fingerprint, max_distance):
+        now = time.time()
+        target = int(fingerprint, 16)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value, fingerprint, created FROM entries WHERE namespace = ? AND fingerprint IS NOT NULL",
+                (self.namespace,)
+            ).fetchall()
+            best = None
+            for key, value, candidate, created in rows:
+                if self._expired(created, now):
+                    continue
+                distance = bin(target ^ int(candidate, 16)).count("1")
+                if distance <= max_distance and (best is None or distance < best[0]):
+                    best = (distance, key, value)
+            if best is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET accessed = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, best[1])
+            )
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(best[2])
+
+    def set(self, key, value, fingerprint=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, fingerprint, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), fingerprint, now, now)
+            )
+            if self.ttl is not None:
+                expired = self._conn.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND created < ?",
+                    (self.namespace, now - self.ttl)
+                ).rowcount
+                self.evictions += expired
+            count = self._conn.execute(
+                "SELECT COUNT(*) FROM entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+            if count > self.max_entries:
+                overflow = count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND key IN ("
+                    "SELECT key FROM entries WHERE namespace = ? ORDER BY accessed ASC LIMIT ?)",
+                    (self.namespace, self.namespace, overflow)
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    # Read without touching counters or recency
+    def peek(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+        if not row or self._expired(row[1], time.time()):
+            return None
+        return json.loads(row[0])
+
+    # Every live (key, value) pair in the namespace
+    def scan(self):
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value, created FROM entries WHERE namespace = ?", (self.namespace,)
+            ).fetchall()
+        return [(key, json.loads(value)) for key, value, created in rows if not self._expired(created, now)]
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+# Key for a cached LLM response: the normalized prompt inputs plus the menu content hash,
+# so any menu change moves every dependent entry to a fresh key
+def response_key(kind, menu_hash, **inputs):
+    payload = json.dumps({"kind": kind, "menu": menu_hash, "inputs": inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# Difference hash: 64-bit perceptual fingerprint that survives recompression and resizing
+def perceptual_hash(image_content, hash_size=8):
+    image = Image.open(io.BytesIO(image_content))
+    image.draft("L", (hash_size * 8, hash_size * 8))
+    pixels = list(image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+# Image-keyed result cache: exact SHA-256 lookup, optionally falling back to a perceptual match
+class ImageResultCache:
+    def __init__(self, store, perceptual=False, max_distance=6):
+        self.store = store
+        self.perceptual = perceptual
+        self.max_distance = max_distance
+
+    def get(self, image_content):
+        key = hashlib.sha256(image_content).hexdigest()
+        value = self.store.get(key, record_miss=not self.perceptual)
+        if value is not None or not self.perceptual:
+            return value
+        try:
+            fingerprint = perceptual_hash(image_content)
+        except Exception:
+            self.store.record_miss()
+            return None
+        return self.store.get_similar(fingerprint, self.max_distance)
+
+    def set(self, image_content, value):
+        key = hashlib.sha256(image_content).hexdigest()
+        fingerprint = None
+        if self.perceptual:
+            try:
+                fingerprint = perceptual_hash(image_content)
+            except Exception:
+                pass
+        self.store.set(key, value, fingerprint=fingerprint)
+
+    def stats(self):
+        return self.store.stats()
+
+# Vision labels that show up on nearly every food photo and say nothing about which dish it is
+GENERIC_LABELS = frozenset([
+    "food", "dish", "cuisine", "ingredient", "recipe", "meal", "produce", "tableware", "dishware", "serveware",
+    "plate", "staple food", "comfort food", "fast food", "finger food", "natural foods", "baked goods", "garnish",
+    "delicacy", "lunch", "dinner", "breakfast", "brunch", "table"
+])
+
+# Memo from a Vision label set to the dish name Gemini gave for it. Keys are order-insensitive;
+# near-identical sets match by Jaccard similarity weighted with Vision's label scores, computed over
+# the specific (non-generic) labels only, and only against entries that share the query's most
+# specific label. Near matches go through an in-memory label -> keys index, rebuilt from the store
+# every index_refresh seconds so entries written by other workers show up.
+class LabelMemo:
+    def __init__(self, store, min_similarity=0.7, generic_labels=GENERIC_LABELS, index_refresh=300):
+        self.store = store
+        self.min_similarity = min_similarity
+        self.generic_labels = generic_labels
+        self.index_refresh = index_refresh
+        self.near_hits = 0
+        self._postings = {}
+        self._specific = {}
+        self._indexed_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _weights(scored_labels):
+        weights = {}
+        for label, score in scored_labels:
+            label = " ".join(str(label).lower().split())
+            weights[label] = max(weights.get(label, 0.0), float(score or 0.0))
+        return weights
+
+    @staticmethod
+    def _key(weights):
+        return "|".join(sorted(weights))
+
+    def _specific_weights(self, weights):
+        return {label: weight for label, weight in weights.items() if label not in self.generic_labels}
+
+    @staticmethod
+    def similarity(a, b):
+        union = set(a) | set(b)
+        total = sum(max(a.get(label, 0.0), b.get(label, 0.0)) for label in union)
+        shared = sum(min(a.get(label, 0.0), b.get(label, 0.0)) for label in union)
+        return shared / total if total else 0.0
+
+    @staticmethod
+    def _best(entry):
+        return max(entry["dishes"].items(), key=lambda pair: pair[1])[0]
+
+    # Caller holds self._lock
+    def _index(self, key, weights):
+        specific = self._specific_weights(weights)
+        self._specific[key] = specific
+        for label in specific:
+            self._postings.setdefault(label, set()).add(key)
+
+    # Caller holds self._lock
+    def _unindex(self, key):
+        for label in self._specific.pop(key, {}):
+            keys = self._postings.get(label)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[label]
+
+    def _ensure_index(self):
+        with self._lock:
+            if self._indexed_at is not None and time.monotonic() - self._indexed_at < self.index_refresh:
+                return
+            self._postings = {}
+            self._specific = {}
+            for key, entry in self.store.scan():
+                self._index(key, entry["labels"])
+            self._indexed_at = time.monotonic()
+
+    # Indexed entries sharing the query's most specific label, best similarity first
+    def _near_candidates(self, weights):
+        specific = self._specific_weights(weights)
+        if not specific:
+            return []
+        self._ensure_index()
+        top_label = max(specific, key=specific.get)
+        with self._lock:
+            scored = [(self.similarity(specific, self._specific[key]), key) for key in self._postings.get(top_label, ())]
+        return sorted((pair for pair in scored if pair[0] >= self.min_similarity), reverse=True)
+
+    # Dish name for a [(label, score)] list, or None when no confident entry exists
+    def lookup(self, scored_labels):
+        weights = self._weights(scored_labels)
+        if not weights:
+            return None
+        entry = self.store.get(self._key(weights), record_miss=False)
+        if entry is not None:
+            return self._best(entry)
+        for _, key in self._near_candidates(weights):
+            entry = self.store.get(key, record_miss=False)
+            if entry is None:
+                # Evicted or expired since the index was built
+                with self._lock:
+                    self._unindex(key)
+                continue
+            self.near_hits += 1
+            return self._best(entry)
+        self.store.record_miss()
+        return None
+
+    # Record the dish name Gemini gave; repeated answers for the same set act as votes
+    def remember(self, scored_labels, dish_name):
+        weights = self._weights(scored_labels)
+        if not weights:
+            return
+        key = self._key(weights)
+        entry = self.store.peek(key) or {"dishes": {}}
+        entry["labels"] = weights
+        entry["dishes"][dish_name] = entry["dishes"].get(dish_name, 0) + 1
+        self.store.set(key, entry)
+        with self._lock:
+            if self._indexed_at is not None:
+                self._unindex(key)
+                self._index(key, weights)
+
+    def stats(self):
+        stats = self.store.stats()
+        stats["near_hits"] = self.near_hits
+        return stats
@@ -0,0 +1,335 @@
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+import pandas as pd
+from cache import GENERIC_LABELS, DiskCache, ImageResultCache, LabelMemo, response_key
+from clients import Clients, ConfigurationError
+from gateway import Gateway, RateLimitExceeded
+from imaging import prepare_image
+from llm import stream_to, StreamTimeout
+from menu_frame import MenuFrame, DISPLAY_COLUMNS
+from menu_index import MenuIndex, menu_key, menu_content_hash, normalize, fit_to_budget, estimate_tokens
+from menu_store import MenuStore
+from metrics import Metrics
+from recognition import label_image, name_dish, match_dish
+from resilience import CircuitOpen, Deadline, DeadlineExceeded, deadline_scope, is_transient, remaining_budget
+
+logger = logging.getLogger(__name__)
+
+# UI-free core of the app: recognition, menu access, matching, suggestions and filtering.
+# Errors are raised rather than displayed; the Streamlit app and the HTTP service decide how to show them.
+# `settings` is the [TUNING] section of secrets.toml (same names and defaults as the app).
+
+REQUIRED_SECRETS = ["GOOGLE_CLOUD_VISION_CREDENTIALS", "FIREBASE_CREDENTIALS", "GEMINI"]
+
+Detection = namedtuple("Detection", ["dish", "cached", "degraded"])
+Suggestions = namedtuple("Suggestions", ["text", "cached", "degraded"])
+
+def load_secrets(path):
+    import tomllib
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+def build_metrics(settings):
+    metrics = Metrics(sample_rate=settings.get("metrics_sample_rate", 1.0))
+    export_path = settings.get("metrics_export_path")
+    if export_path:
+        metrics.export_periodically(export_path, interval=settings.get("metrics_export_seconds", 15))
+    return metrics
+
+def build_gateway(settings, metrics=None):
+    return Gateway(
+        {
+            "vision": (settings.get("vision_rate_per_second", 10), settings.get("vision_burst", 20), settings.get("vision_max_concurrency", 8)),
+            "gemini": (settings.get("gemini_rate_per_second", 5), settings.get("gemini_burst", 10), settings.get("gemini_max_concurrency", 8))
+        },
+        max_workers=settings.get("gateway_workers", 16),
+        acquire_timeout=settings.get("gateway_acquire_timeout_seconds", 30),
+        default_timeout=settings.get("rpc_timeout_seconds", 30),
+        retry_attempts=settings.get("retry_attempts", 3),
+        breaker_threshold=settings.get("breaker_failure_threshold", 5),
+        breaker_reset=settings.get("breaker_reset_seconds", 30),
+        stream_timeout=settings.get("llm_stream_max_seconds", 300),
+        metrics=metrics
+    )
+
+def build_clients(secrets, gateway=None):
+    missing = [key for key in REQUIRED_SECRETS if key not in secrets]
+    if missing:
+        raise ConfigurationError("Missing sections in secrets.toml")
+    return Clients(
+        dict(secrets["GOOGLE_CLOUD_VISION_CREDENTIALS"]),
+        dict(secrets["FIREBASE_CREDENTIALS"]),
+        secrets["GEMINI"]["api_key"],
+        gateway=gateway
+    )
+
+def build_dish_cache(settings):
+    store = DiskCache(
+        settings.get("cache_path", ".cache/app_cache.sqlite3"),
+        namespace="detect_dish",
+        max_entries=settings.get("dish_cache_max_entries", 5000),
+        ttl=settings.get("dish_cache_ttl_seconds", 7 * 24 * 3600)
+    )
+    # Perceptual matching is opt-in: with fixed camera framing, different dishes can hash within a few bits
+    return ImageResultCache(
+        store,
+        perceptual=settings.get("dish_cache_perceptual", False),
+        max_distance=settings.get("dish_cache_max_distance", 6)
+    )
+
+def build_label_memo(settings):
+    store = DiskCache(
+        settings.get("cache_path", ".cache/app_cache.sqlite3"),
+        namespace="label_memo",
+        max_entries=settings.get("label_memo_max_entries", 20000),
+        ttl=settings.get("label_memo_ttl_seconds", 30 * 24 * 3600)
+    )
+    return LabelMemo(store, min_similarity=settings.get("label_memo_min_similarity", 0.7))
+
+def build_response_cache(settings):
+    return DiskCache(
+        settings.get("cache_path", ".cache/app_cache.sqlite3"),
+        namespace="llm_responses",
+        max_entries=settings.get("response_cache_max_entries", 2000),
+        ttl=settings.get("response_cache_ttl_seconds", 24 * 3600)
+    )
+
+# Local stand-in when Gemini is unavailable or out of time: the best retrieved menu items as a plain list
+DEGRADED_NOTE = "_Live suggestions are unavailable right now, so these are the closest matches on the menu._"
+
+def degraded_suggestions(items, limit=3):
+    lines = [f"- **{item['name']}**: {item.get('description', '')} ({', '.join(item.get('dietary_tags', [])) or 'No dietary tags'})" for item in items[:limit]]
+    return "\n".join([DEGRADED_NOTE, ""] + lines) if lines else DEGRADED_NOTE
+
+# Token counts, worker queueing and time to first token of a streamed answer, on a metrics span
+def record_stream(span, stream_stats, prompt):
+    span.set("prompt_tokens", stream_stats.get("prompt_tokens", estimate_tokens(prompt)))
+    span.set("response_tokens", stream_stats.get("response_tokens"))
+    span.set("ttft_ms", stream_stats.get("ttft_ms"))
+    span.set("queue_ms", stream_stats.get("queue_ms"))
+
+class Engine:
+    def __init__(self, clients, settings=None, dish_cache=None, label_memo=None, response_cache=None, metrics=None):
+        self.clients = clients
+        self.settings = settings or {}
+        self.dish_cache = dish_cache
+        self.label_memo = label_memo
+        self.response_cache = response_cache
+        self.metrics = metrics or Metrics(sample_rate=0)
+        self._menu_store = None
+        self._per_menu = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Everything from secrets.toml: clients behind a gateway, the persistent caches and metrics
+    @classmethod
+    def from_secrets(cls, secrets):
+        settings = dict(secrets.get("TUNING", {}))
+        metrics = build_metrics(settings)
+        clients = build_clients(secrets, build_gateway(settings, metrics))
+        clients.warm_async()
+        return cls(clients, settings, build_dish_cache(settings), build_label_memo(settings), build_response_cache(settings), metrics)
+
+    def setting(self, name, default):
+        return self.settings.get(name, default)
+
+    # Process-wide menu store: one full load, then incremental updates from Firestore
+    @property
+    def menu_store(self):
+        if self._menu_store is None:
+            with self._lock:
+                if self._menu_store is None:
+                    self._menu_store = MenuStore(
+                        self.clients.db,
+                        listen=self.setting("menu_listen", True),
+                        refresh_interval=self.setting("menu_refresh_seconds", 60),
+                        full_reload_interval=self.setting("menu_full_reload_seconds", 600)
+                    )
+        return self._menu_store
+
+    def menu(self):
+        with self.metrics.span("fetch_menu") as span:
+            menu_items = self.menu_store.items()
+            span.set("items", len(menu_items))
+        return menu_items
+
+    # Index and frame built once per menu content, for the few most recent menus
+    def _for_menu(self, kind, menu_items, build):
+        key = (kind, menu_key(menu_items))
+        with self._lock:
+            if key in self._per_menu:
+                self._per_menu.move_to_end(key)
+                return self._per_menu[key]
+        built = build(menu_items)
+        with self._lock:
+            self._per_menu[key] = built
+            while len(self._per_menu) > 8:
+                self._per_menu.popitem(last=False)
+        return built
+
+    def menu_index(self, menu_items):
+        return self._for_menu("index", menu_items, MenuIndex)
+
+    def menu_frame(self, menu_items):
+        return self._for_menu("frame", menu_items, MenuFrame)
+
+    # Downscale and re-encode an upload; raises ValueError for unsupported formats
+    def prepare(self, image_content):
+        with self.metrics.span("prepare_image", bytes=len(image_content)) as span:
+            prepared = prepare_image(
+                image_content,
+                max_edge=self.setting("image_max_edge", 1600),
+                max_bytes=self.setting("image_max_bytes", 1_500_000),
+                quality=self.setting("image_jpeg_quality", 85)
+            )
+            span.set("bytes_saved", prepared.bytes_saved)
+        return prepared
+
+    # Dish name for an image, within the request's remaining budget (capped per detection).
+    # If Gemini's circuit is open the top specific Vision label (not "Food", "Dish", ...) stands in for
+    # the dish name, uncached; with only generic labels the CircuitOpen is raised.
+    def detect_dish(self, image_content):
+        with self.metrics.span("detect_dish", bytes=len(image_content)) as span:
+            cached = self.dish_cache.get(image_content) if self.dish_cache is not None else None
+            span.cache(cached is not None)
+            if cached is not None:
+                return Detection(cached, True, False)
+            budget = min(self.setting("dish_detection_timeout_seconds", 10), remaining_budget(float("inf")))
+            labels = []
+            with deadline_scope(Deadline(budget)):
+                try:
+                    labels = label_image(self.clients.vision, image_content)
+                    with self.metrics.span("name_dish", labels=len(labels)):
+                        dish_name = name_dish(self.clients.gemini, labels, self.label_memo)
+                except CircuitOpen:
+                    specific = [label for label, _ in labels if " ".join(label.lower().split()) not in GENERIC_LABELS]
+                    if not specific:
+                        raise
+                    logger.warning("Gemini unavailable, using the Vision label %r as the dish name", specific[0])
+                    return Detection(specific[0], False, True)
+            if self.dish_cache is not None:
+                self.dish_cache.set(image_content, dish_name)
+            return Detection(dish_name, False, False)
+
+    # Local fuzzy index first; Gemini only breaks ties between ambiguous candidates.
+    # Returns (item or None, message, confidence); message is DEGRADED_MATCH_MESSAGE for a local fallback.
+    def match_dish(self, dish_name, menu_items):
+        with self.metrics.span("match_dish"):
+            return match_dish(
+                self.clients.gemini,
+                self.menu_index(menu_items),
+                dish_name,
+                menu_items,
+                candidates=self.setting("match_candidates", 10),
+                min_score=self.setting("match_min_score", 0.5),
+                min_margin=self.setting("match_min_margin", 0.15)
+            )
+
+    # Stream a suggestion prompt (cached by key), falling back to a local list when Gemini is out of reach:
+    # circuit open, out of time or quota, or still failing transiently after retries
+    def _suggest(self, stage, timeout_setting, cache_key, relevant_items, prompt, on_text, label):
+        with self.metrics.span(stage) as span:
+            cached = self.response_cache.get(cache_key) if self.response_cache is not None else None
+            span.cache(cached is not None)
+            if cached is not None:
+                if on_text:
+                    on_text(cached)
+                return Suggestions(cached, True, False)
+            stream_stats = {}
+            try:
+                with deadline_scope(Deadline(min(self.setting(timeout_setting, 30), remaining_budget(float("inf"))))):
+                    text = stream_to(
+                        self.clients.gemini,
+                        prompt,
+                        on_text=on_text,
+                        stats=stream_stats,
+                        first_token_timeout=self.setting("llm_first_token_timeout_seconds", 10),
+                        chunk_timeout=self.setting("llm_chunk_timeout_seconds", 10),
+                        label=label,
+                        executor=self.clients.gateway
+                    )
+            except Exception as e:
+                if not isinstance(e, (CircuitOpen, DeadlineExceeded, RateLimitExceeded, StreamTimeout)) and not is_transient(e):
+                    raise
+                logger.warning("%s degraded: %s", label.capitalize(), e)
+                fallback = degraded_suggestions(relevant_items)
+                if on_text:
+                    on_text(fallback)
+                return Suggestions(fallback, False, True)
+            record_stream(span, stream_stats, prompt)
+            if text and self.response_cache is not None:
+                self.response_cache.set(cache_key, text)
+            return Suggestions(text, False, False)
+
+    # Personalized recommendations for a detected dish; on_text receives the text as it streams in
+    def recommend(self, dish_name, menu_items, dietary_preferences, on_text=None):
+        cache_key = response_key(
+            "recommendations",
+            menu_content_hash(menu_items),
+            dish=normalize(dish_name),
+            preferences=sorted(dietary_preferences or []),
+            top_k=self.setting("retrieval_top_k", 25),
+            token_budget=self.setting("prompt_token_budget", 2000)
+        )
+        relevant_items = self.menu_index(menu_items).retrieve(dish_name, dietary_preferences, k=self.setting("retrieval_top_k", 25))
+        menu_lines = fit_to_budget(
+            [f"- {item['name']}: {item.get('description', '')}, Ingredients: {', '.join(item.get('ingredients', []))}, Tags: {', '.join(item.get('dietary_tags', []))}" for item in relevant_items],
+            self.setting("prompt_token_budget", 2000)
+        )
+        menu_text = "\n".join(menu_lines)
+        preferences_text = ", ".join(dietary_preferences) if dietary_preferences else "No dietary preferences specified."
+        prompt = f"""
+        Given the detected dish '{dish_name}' and dietary preferences: {preferences_text},
+        recommend up to 3 personalized dishes from the following menu that align with the detected dish, dietary preferences, and popular trends. For each, suggest customizations. Provide output in a markdown list with dish name, description, dietary tags, and customizations.
+        Menu:
+        {menu_text}
+        If no suitable dishes are found, suggest general alternatives.
+        """
+        logger.info("Recommendations prompt: %d of %d menu items, ~%d tokens", len(menu_lines), len(menu_items), estimate_tokens(prompt))
+        return self._suggest("recommendations", "recommendations_timeout_seconds", cache_key, relevant_items, prompt, on_text, "recommendations")
+
+    # Three dishes for a theme, within the dietary preferences
+    def themed_suggestions(self, theme, menu_items, dietary_preferences, on_text=None):
+        cache_key = response_key(
+            "theme",
+            menu_content_hash(menu_items),
+            theme=theme,
+            preferences=sorted(dietary_preferences or []),
+            top_k=self.setting("retrieval_top_k", 25),
+            token_budget=self.setting("prompt_token_budget", 2000)
+        )
+        themed_items = self.menu_index(menu_items).retrieve(dietary_preferences=dietary_preferences, theme=theme, k=self.setting("retrieval_top_k", 25))
+        menu_lines = fit_to_budget(
+            [f"- {item['name']}: {item.get('description', '')}, Tags: {', '.join(item.get('dietary_tags', []))}" for item in themed_items],
+            self.setting("prompt_token_budget", 2000)
+        )
+        menu_text = "\n".join(menu_lines)
+        prompt = f"""
+        From the following menu, suggest 3 dishes that fit the '{theme}' theme and align with the dietary preferences: {', '.join(dietary_preferences) if dietary_preferences else 'None'}. Include the dish name, description, and dietary tags in a formatted markdown list.
+        Menu:
+        {menu_text}
+        """
+        logger.info("Theme prompt (%s): %d of %d menu items, ~%d tokens", theme, len(menu_lines), len(menu_items), estimate_tokens(prompt))
+        return self._suggest("themed_suggestions", "theme_timeout_seconds", cache_key, themed_items, prompt, on_text, "themed suggestions")
+
+    # Menu items matching the dietary preferences, annotated with the chosen portion size and swaps
+    def customize_menu(self, menu_items, dietary_preferences, portion_size=None, ingredient_swaps=None):
+        frame = self.menu_frame(menu_items)
+        filtered_items = []
+        for row in frame.rows(dietary_preferences):
+            filtered_item = frame.items[row].copy()
+            if portion_size:
+                filtered_item["portion_size"] = portion_size
+            if ingredient_swaps:
+                filtered_item["custom_ingredients"] = ingredient_swaps
+            filtered_items.append(filtered_item)
+        return filtered_items
+
+    # Display table for the filtered menu (a cached view of the menu frame)
+    def menu_table(self, menu_items, dietary_preferences, portion_size=None, ingredient_swaps=None):
+        if not menu_items:
+            return pd.DataFrame(columns=DISPLAY_COLUMNS)
+        with self.metrics.span("menu_table") as span:
+            df = self.menu_frame(menu_items).display(dietary_preferences, portion_size, ingredient_swaps)
+            span.set("rows", len(df))
+        return df
@@ -0,0 +1,245 @@
+import hashlib
+import io
+import math
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+from google.api_core import exceptions as api_exceptions
+from PIL import Image
+
+# Local stand-ins for Vision, Gemini and the Firestore menu collection, for benchmarks and load tests.
+# They mimic only the parts of each client API the app uses, with configurable latency and failures.
+
+DIETARY_TAGS = ["Vegan", "Vegetarian", "Gluten-Free", "Keto", "Dairy-Free", "Low-Sugar"]
+GENERIC_LABELS = ["Food", "Dish", "Cuisine", "Ingredient", "Recipe"]
+
+# Log-normal latency with the given median (seconds); sigma controls the tail, failure_rate the share
+# of calls that raise ServiceUnavailable. scale multiplies every delay (0 disables sleeping).
+class Latency:
+    def __init__(self, median=0.1, sigma=0.5, failure_rate=0.0, scale=1.0, seed=None):
+        self.median = median
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+        self.scale = scale
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        if self.median <= 0 or self.scale <= 0:
+            return 0.0
+        with self._lock:
+            return self._random.lognormvariate(math.log(self.median), self.sigma) * self.scale
+
+    def failed(self):
+        if self.failure_rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < self.failure_rate
+
+    # Sleep for one sampled delay (never past timeout), then maybe fail
+    def wait(self, timeout=None):
+        delay = self.sample()
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise api_exceptions.DeadlineExceeded("Fake call exceeded its timeout")
+        time.sleep(delay)
+        if self.failed():
+            raise api_exceptions.ServiceUnavailable("Fake service unavailable")
+
+_Label = namedtuple("_Label", ["description", "score"])
+_Status = namedtuple("_Status", ["message"])
+_Usage = namedtuple("_Usage", ["prompt_token_count", "candidates_token_count"])
+
+class FakeLabelResponse:
+    def __init__(self, labels, error=""):
+        self.label_annotations = labels
+        self.error = _Status(error)
+
+class FakeBatchResponse:
+    def __init__(self, responses):
+        self.responses = responses
+
+# vision.ImageAnnotatorClient: labels are the words of a dish picked deterministically from the image bytes,
+# followed by generic food labels, so the same image always yields the same labels
+class FakeVisionClient:
+    def __init__(self, dish_names, latency=None):
+        self.dish_names = list(dish_names) or ["Mystery Dish"]
+        self.latency = latency or Latency(0.15)
+        self.calls = 0
+
+    def _labels(self, content):
+        digest = int.from_bytes(hashlib.sha256(content).digest()[:8], "big")
+        words = self.dish_names[digest % len(self.dish_names)].split()
+        descriptions = words + GENERIC_LABELS
+        return [_Label(description, round(0.98 - 0.05 * i, 2)) for i, description in enumerate(descriptions)]
+
+    def label_detection(self, image, timeout=None, **kwargs):
+        self.calls += 1
+        self.latency.wait(timeout)
+        return FakeLabelResponse(self._labels(image.content))
+
+    def batch_annotate_images(self, requests, timeout=None, **kwargs):
+        self.calls += 1
+        self.latency.wait(timeout)
+        return FakeBatchResponse([FakeLabelResponse(self._labels(request.image.content)) for request in requests])
+
+class FakeGeminiResponse:
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage_metadata = usage
+
+# GenerativeModel: answers the app's three prompt shapes (dish naming, menu matching, suggestion lists)
+# from the prompt itself. Streamed answers arrive as `chunks` pieces, the first after `latency`
+# (waited inside generate_content) and the rest `chunk_latency` apart; the last chunk carries the usage metadata.
+class FakeGenerativeModel:
+    def __init__(self, latency=None, chunk_latency=None, chunks=8):
+        self.latency = latency or Latency(0.4)
+        self.chunk_latency = chunk_latency or Latency(0.03, sigma=0.3)
+        self.chunks = chunks
+        self.calls = 0
+
+    def _answer(self, prompt):
+        if "identify the most likely dish:" in prompt:
+            labels = prompt.split("identify the most likely dish:", 1)[1].split(",")
+            return " ".join(label.strip() for label in labels if label.strip() not in GENERIC_LABELS) or "Unknown dish"
+        names = re.findall(r"^\s*- ([^:\n]+):", prompt, re.MULTILINE)
+        if "find the most similar or exact match" in prompt:
+            return names[0] if names else "No close match found"
+        if not names:
+            return "No suitable dishes found; try a general alternative."
+        return "\n".join(f"- **{name}**: a popular choice. Customization: ask for extra herbs." for name in names[:3])
+
+    def _usage(self, prompt, text):
+        return _Usage(len(prompt) // 4, len(text) // 4)
+
+    def generate_content(self, prompt, stream=False, request_options=None, **kwargs):
+        self.calls += 1
+        timeout = (request_options or {}).get("timeout")
+        # Like the SDK, a streamed call blocks for the first chunk (and fails) here, not when iterated
+        self.latency.wait(timeout)
+        text = self._answer(prompt)
+        if not stream:
+            return FakeGeminiResponse(text, self._usage(prompt, text))
+        return self._stream(prompt, text)
+
+    def _stream(self, prompt, text):
+        size = max(1, math.ceil(len(text) / self.chunks))
+        pieces = [text[start:start + size] for start in range(0, len(text), size)] or [""]
+        for i, piece in enumerate(pieces):
+            if i:
+                self.chunk_latency.wait()
+            yield FakeGeminiResponse(piece, self._usage(prompt, text) if i == len(pieces) - 1 else None)
+
+class FakeDocument:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+class FakeQuery:
+    def __init__(self, collection, predicate):
+        self._collection = collection
+        self._predicate = predicate
+
+    def stream(self):
+        return self._collection._stream(self._predicate)
+
+_OPERATORS = {
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    "==": lambda a, b: a == b
+}
+
+# Firestore collection supporting stream() and where(filter=FieldFilter(...)) with comparison operators.
+# Without on_snapshot, MenuStore uses its polling mode against it.
+class FakeCollection:
+    def __init__(self, documents, latency=None, per_document=0.00002):
+        self._documents = documents
+        self.latency = latency or Latency(0.05)
+        self.per_document = per_document
+        self.reads = 0
+
+    def _stream(self, predicate=None):
+        self.latency.wait()
+        matched = [(doc_id, data) for doc_id, data in list(self._documents.items()) if predicate is None or predicate(data)]
+        self.reads += len(matched)
+        if self.per_document and self.latency.scale > 0:
+            time.sleep(self.per_document * len(matched) * self.latency.scale)
+        return iter([FakeDocument(doc_id, data) for doc_id, data in matched])
+
+    def stream(self):
+        return self._stream()
+
+    def where(self, filter=None, **kwargs):
+        compare = _OPERATORS[filter.op_string]
+        field, value = filter.field_path, filter.value
+        return FakeQuery(self, lambda data: field in data and compare(data[field], value))
+
+class FakeFirestore:
+    def __init__(self, menu_items, latency=None):
+        self.documents = {item.get("id", f"item-{i}"): {k: v for k, v in item.items() if k != "id"} for i, item in enumerate(menu_items)}
+        self.latency = latency or Latency(0.05)
+        self._collections = {}
+
+    def collection(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(self.documents if name == "menu" else {}, self.latency)
+        return self._collections[name]
+
+    # Simulate an edit in the console: bump updated_at so polling stores pick it up
+    def touch(self, doc_id, **changes):
+        data = self.documents[doc_id]
+        data.update(changes)
+        data["updated_at"] = max(item.get("updated_at", 0) for item in self.documents.values()) + 1
+
+STYLES = ["Spicy", "Smoky", "Crispy", "Creamy", "Herbed", "Roasted", "Grilled", "Sweet", "Tangy", "Garlic", "Lemon", "Classic"]
+PROTEINS = ["Chicken", "Tofu", "Paneer", "Shrimp", "Beef", "Mushroom", "Salmon", "Chickpea", "Lamb", "Egg"]
+BASES = [
+    "Pizza", "Pasta", "Risotto", "Lasagna", "Taco", "Burrito", "Quesadilla", "Nachos", "Sushi", "Ramen", "Curry",
+    "Noodles", "Dumplings", "Salad", "Bowl", "Soup", "Sandwich", "Wrap", "Burger", "Stir Fry", "Tiramisu", "Cheesecake",
+    "Smoothie", "Pho"
+]
+INGREDIENTS = ["tomato", "basil", "rice", "beans", "cheese", "avocado", "spinach", "garlic", "ginger", "chili", "lime", "quinoa", "corn", "soy", "yogurt"]
+REGIONS = ["Italian", "Mexican", "Asian", "Healthy", "house"]
+
+# Deterministic synthetic menu of n distinct dishes (n up to 2,880 * number of regions)
+def synthetic_menu(n, seed=0):
+    rng = random.Random(seed)
+    combos = len(STYLES) * len(PROTEINS) * len(BASES)
+    if n > combos * len(REGIONS):
+        raise ValueError(f"At most {combos * len(REGIONS)} synthetic dishes are available")
+    items = []
+    for i, combo in enumerate(rng.sample(range(combos * len(REGIONS)), n)):
+        region, combo = divmod(combo, combos)
+        style, rest = divmod(combo, len(PROTEINS) * len(BASES))
+        protein, base = divmod(rest, len(BASES))
+        name = f"{STYLES[style]} {PROTEINS[protein]} {BASES[base]}"
+        if region:
+            name = f"{REGIONS[region]} {name}"
+        items.append({
+            "id": f"item-{i}",
+            "name": name,
+            "description": f"{REGIONS[region].capitalize()} {BASES[base].lower()} with {PROTEINS[protein].lower()}, finished {STYLES[style].lower()}.",
+            "ingredients": rng.sample(INGREDIENTS, 4) + [PROTEINS[protein].lower()],
+            "dietary_tags": rng.sample(DIETARY_TAGS, rng.randint(0, 3)),
+            "updated_at": i
+        })
+    return items
+
+# n distinct phone-camera-sized JPEGs (upscaled noise, so they compress like photos rather than flat colour)
+def synthetic_images(n, size=(4032, 3024), quality=92, seed=0):
+    rng = random.Random(seed)
+    images = []
+    for _ in range(n):
+        tile = Image.frombytes("RGB", (size[0] // 8, size[1] // 8), rng.randbytes(size[0] // 8 * (size[1] // 8) * 3))
+        image = tile.resize(size, Image.BILINEAR)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality)
+        images.append(buffer.getvalue())
+    return images
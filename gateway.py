@@ -0,0 +1,234 @@
+import contextvars
+import hashlib
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from resilience import (
+    CircuitBreaker, DeadlineExceeded, LatencyTracker, call_with_retries, current_deadline,
+    hedged_call, is_transient, remaining_budget
+)
+
+class RateLimitExceeded(Exception):
+    pass
+
+# Classic token bucket: `rate` tokens per second, holding at most `burst`
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Block until a token is available; raise RateLimitExceeded if that would take longer than timeout
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                raise RateLimitExceeded(f"Rate limit wait of {wait:.2f}s exceeds the remaining {max(0.0, deadline - now):.2f}s")
+            time.sleep(wait)
+
+# Identical concurrent calls share one execution: the first caller runs it, the rest wait for its result
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+# Process-wide gate in front of every Vision/Gemini call: single-flight dedupe, a token bucket and a
+# concurrency cap per API, plus one bounded worker pool for background work (timeouts, streaming).
+# Calls run inside the caller's request deadline (see resilience.deadline_scope): transient failures
+# are retried with jittered backoff while budget remains, slow calls can be hedged after the API's
+# observed p95, and a circuit breaker per API fails fast while it is unhealthy.
+# With a metrics.Metrics, every attempt is recorded as an "api.<name>" stage.
+class Gateway:
+    def __init__(self, limits, max_workers=16, acquire_timeout=30, default_timeout=30, retry_attempts=3,
+                 hedge_percentile=95, breaker_threshold=5, breaker_reset=30, stream_timeout=300, metrics=None):
+        self.buckets = {api: TokenBucket(rate, burst) for api, (rate, burst, _) in limits.items()}
+        self.slots = {api: threading.BoundedSemaphore(concurrency) for api, (_, _, concurrency) in limits.items()}
+        self.breakers = {api: CircuitBreaker(api, breaker_threshold, breaker_reset) for api in limits}
+        self.latency = {api: LatencyTracker() for api in limits}
+        self.acquire_timeout = acquire_timeout
+        self.default_timeout = default_timeout
+        self.stream_timeout = stream_timeout
+        self.retry_attempts = retry_attempts
+        self.hedge_percentile = hedge_percentile
+        self.metrics = metrics
+        self.flights = SingleFlight()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gateway")
+        self.hedge_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gateway-hedge")
+        self.calls = {api: 0 for api in limits}
+        self.hedges = {api: 0 for api in limits}
+        self._lock = threading.Lock()
+
+    # One attempt: wait for the API's rate limit and a free concurrency slot, then run fn
+    def _attempt(self, api, fn, usage=False):
+        wait_budget = min(self.acquire_timeout, remaining_budget(self.acquire_timeout))
+        self.buckets[api].acquire(wait_budget)
+        if not self.slots[api].acquire(timeout=wait_budget):
+            raise RateLimitExceeded(f"No free {api} slot within {wait_budget:.1f}s")
+        try:
+            with self._lock:
+                self.calls[api] += 1
+            started = time.monotonic()
+            try:
+                result = fn()
+            except Exception:
+                if self.metrics:
+                    self.metrics.observe(f"api.{api}", time.monotonic() - started, failed=True)
+                raise
+            elapsed = time.monotonic() - started
+            self.latency[api].record(elapsed)
+            if self.metrics:
+                self.metrics.observe(f"api.{api}", elapsed, **(_usage(result) if usage else {}))
+            return result
+        finally:
+            self.slots[api].release()
+
+    def _hedged_attempt(self, api, fn, usage=False):
+        hedge_after = self.latency[api].percentile(self.hedge_percentile)
+        if hedge_after is None:
+            return self._attempt(api, fn, usage)
+        parent = contextvars.copy_context()
+        def attempt():
+            return parent.copy().run(self._attempt, api, fn, usage)
+        def on_hedge():
+            with self._lock:
+                self.hedges[api] += 1
+        return hedged_call(attempt, self.hedge_pool, hedge_after, timeout=remaining_budget(), on_hedge=on_hedge)
+
+    # usage=True records the token counts of a (non-streamed) Gemini response in the metrics
+    def run(self, api, fn, hedge=False, usage=False):
+        breaker = self.breakers[api]
+        breaker.before_call()
+        deadline = current_deadline.get()
+        try:
+            result = call_with_retries(
+                (lambda: self._hedged_attempt(api, fn, usage)) if hedge else (lambda: self._attempt(api, fn, usage)),
+                deadline,
+                attempts=self.retry_attempts,
+                typical_duration=self.latency[api].percentile(50) or 0.0
+            )
+        except Exception as e:
+            if is_transient(e):
+                breaker.record_failure()
+            elif isinstance(e, (DeadlineExceeded, RateLimitExceeded)):
+                breaker.release_probe()
+            else:
+                # The API answered, just with an error about this request
+                breaker.record_success()
+            if deadline is not None and deadline.expired and not isinstance(e, DeadlineExceeded):
+                raise DeadlineExceeded(f"{api} call did not finish within the request budget") from e
+            raise
+        breaker.record_success()
+        return result
+
+    def call(self, api, key, fn, hedge=False, usage=False):
+        return self.flights.do((api, key), lambda: self.run(api, fn, hedge=hedge, usage=usage))
+
+    # Run fn on the shared pool, carrying over the caller's request deadline
+    def submit(self, fn, *args, **kwargs):
+        return self.pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+    # Per-call RPC timeout: whatever is left of the request budget, so abandoned calls stop server-side
+    def rpc_timeout(self):
+        return max(0.1, remaining_budget(self.default_timeout))
+
+    def stats(self):
+        return {
+            "calls": dict(self.calls),
+            "hedged": dict(self.hedges),
+            "deduplicated": self.flights.shared,
+            "circuits": {api: breaker.state for api, breaker in self.breakers.items()},
+            "p95_seconds": {api: tracker.percentile(95) for api, tracker in self.latency.items()}
+        }
+
+# Token counts from a non-streamed generate_content response, when it reports them
+def _usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return {}
+    return {"prompt_tokens": usage.prompt_token_count, "response_tokens": usage.candidates_token_count}
+
+def _digest(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+# Drop-in wrapper for a GenerativeModel: identical in-flight prompts are sent once.
+# Streamed calls are rate limited but not shared, since each caller consumes its own stream.
+class GatedModel:
+    def __init__(self, model, gateway, api="gemini"):
+        self._model = model
+        self._gateway = gateway
+        self._api = api
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        if stream:
+            # Streams are paced by the consumer's first-token and gap timeouts; this generous total limit only
+            # makes sure an abandoned, stalled stream eventually gives its worker back
+            kwargs.setdefault("request_options", {"timeout": self._gateway.stream_timeout})
+        if stream or kwargs:
+            return self._gateway.run(self._api, lambda: self._model.generate_content(prompt, stream=stream, **kwargs))
+        return self._gateway.call(
+            self._api,
+            ("generate_content", _digest(prompt)),
+            lambda: self._model.generate_content(prompt, request_options={"timeout": self._gateway.rpc_timeout()}),
+            hedge=True,
+            usage=True
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+# Drop-in wrapper for an ImageAnnotatorClient
+class GatedVision:
+    def __init__(self, client, gateway, api="vision"):
+        self._client = client
+        self._gateway = gateway
+        self._api = api
+
+    def label_detection(self, image, **kwargs):
+        if kwargs:
+            return self._gateway.run(self._api, lambda: self._client.label_detection(image=image, **kwargs))
+        return self._gateway.call(
+            self._api,
+            ("label_detection", _digest(image.content)),
+            lambda: self._client.label_detection(image=image, timeout=self._gateway.rpc_timeout())
+        )
+
+    def batch_annotate_images(self, requests, **kwargs):
+        kwargs.setdefault("timeout", self._gateway.rpc_timeout())
+        return self._gateway.run(self._api, lambda: self._client.batch_annotate_images(requests=requests, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
@@ -0,0 +1,34 @@
+import io
+from collections import namedtuple
+from PIL import Image, ImageOps
+
+SUPPORTED_FORMATS = ("JPEG", "PNG")
+
+PreparedImage = namedtuple("PreparedImage", ["content", "format", "size", "bytes_saved"])
+
+# Prepare an upload for Vision: acceptable bytes without metadata pass through untouched, anything
+# else is oriented, stripped of EXIF (GPS included), downscaled to max_edge and re-encoded as JPEG
+def prepare_image(image_content, max_edge=1600, max_bytes=1_500_000, quality=85):
+    image = Image.open(io.BytesIO(image_content))
+    if image.format not in SUPPORTED_FORMATS:
+        raise ValueError("Unsupported image format. Please upload a JPG or PNG image.")
+    original = PreparedImage(image_content, image.format, image.size, 0)
+    # Any EXIF (orientation included) or XMP means the bytes must be rewritten
+    has_metadata = len(image.getexif()) > 0 or "xmp" in image.info
+    if max(image.size) <= max_edge and len(image_content) <= max_bytes and not has_metadata:
+        return original
+
+    scale = min(1.0, max_edge / max(image.size))
+    # Let the JPEG decoder do most of the downscaling via DCT scaling
+    image.draft("RGB", (int(image.width * scale), int(image.height * scale)))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality, optimize=True)
+    content = output.getvalue()
+    # A re-encode that only dropped metadata or fixed orientation is kept even when it is larger
+    if len(content) >= len(image_content) and not has_metadata:
+        return original
+    return PreparedImage(content, "JPEG", image.size, max(0, len(image_content) - len(content)))
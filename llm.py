@@ -0,0 +1,91 @@
+import logging
+import queue
+import threading
+import time
+from resilience import DeadlineExceeded, remaining_budget
+
+logger = logging.getLogger(__name__)
+
+class StreamTimeout(TimeoutError):
+    pass
+
+_DONE = object()
+
+# Yield text chunks from a streamed generate_content call. The timeouts bound the wait for the first
+# chunk and the gap between chunks, not the total length, so long answers are never cut off.
+# Timing (queue_ms, ttft_ms, total_ms, chunks) and, when the API reports usage, prompt_tokens and response_tokens
+# are written to the optional stats dict and logged.
+# The chunks are read on the given executor's worker, or on a dedicated thread without one. Time spent
+# waiting for that worker (bounded by the request deadline) is local queueing, so the first-token clock
+# only starts once the producer runs, and a producer that starts after the consumer gave up never calls
+# the API. A stalled stream holds its worker until the gateway's total stream timeout.
+def stream_text(model, prompt, first_token_timeout=10, chunk_timeout=10, stats=None, label="gemini", executor=None):
+    stats = stats if stats is not None else {}
+    chunks = queue.Queue()
+    cancelled = threading.Event()
+    producing = threading.Event()
+    requested = time.perf_counter()
+
+    def produce():
+        if cancelled.is_set():
+            return
+        producing.set()
+        iterator = None
+        try:
+            iterator = iter(model.generate_content(prompt, stream=True))
+            for chunk in iterator:
+                if cancelled.is_set():
+                    return
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage:
+                    stats["prompt_tokens"] = usage.prompt_token_count
+                    stats["response_tokens"] = usage.candidates_token_count
+                text = chunk.text
+                if text:
+                    chunks.put(text)
+            chunks.put(_DONE)
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            # Abandoned by the consumer: close the stream so the connection and this worker are released
+            if cancelled.is_set() and hasattr(iterator, "close"):
+                iterator.close()
+
+    if executor is not None:
+        executor.submit(produce)
+    else:
+        threading.Thread(target=produce, name=f"{label}-stream", daemon=True).start()
+    stats["chunks"] = 0
+    try:
+        if not producing.wait(remaining_budget()):
+            raise DeadlineExceeded(f"No worker free for the {label} stream within the request budget")
+        started = time.perf_counter()
+        stats["queue_ms"] = round((started - requested) * 1000, 1)
+        while True:
+            timeout = chunk_timeout if stats["chunks"] else first_token_timeout
+            try:
+                item = chunks.get(timeout=timeout)
+            except queue.Empty:
+                phase = "next chunk" if stats["chunks"] else "first token"
+                raise StreamTimeout(f"No {phase} from {label} within {timeout:g}s")
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            if not stats["chunks"]:
+                stats["ttft_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            stats["chunks"] += 1
+            yield item
+    finally:
+        cancelled.set()
+        stats["total_ms"] = round((time.perf_counter() - requested) * 1000, 1)
+        logger.info("%s stream: queued %s ms, ttft %s ms, total %s ms, %d chunks, %s/%s tokens", label, stats.get("queue_ms", "-"), stats.get("ttft_ms", "-"), stats["total_ms"], stats["chunks"], stats.get("prompt_tokens", "-"), stats.get("response_tokens", "-"))
+
+# Stream into a callback with the accumulated text after each chunk; returns the full text
+def stream_to(model, prompt, on_text=None, **kwargs):
+    text = ""
+    for chunk in stream_text(model, prompt, **kwargs):
+        text += chunk
+        if on_text:
+            on_text(text)
+    return text.strip()
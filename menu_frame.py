@@ -0,0 +1,61 @@
+import threading
+import numpy as np
+import pandas as pd
+
+DISPLAY_COLUMNS = ["Name", "Description", "Ingredients", "Dietary Tags", "Portion Size", "Custom Ingredients"]
+
+# Columnar view of a menu with a dietary-tag bitmask per item, built once per menu version
+class MenuFrame:
+    def __init__(self, menu_items, max_cached_views=64):
+        self.items = list(menu_items)
+        tags = sorted({tag.lower() for item in self.items for tag in item.get("dietary_tags", [])})
+        self.tag_bits = {tag: bit for bit, tag in enumerate(tags)}
+        words = max(1, (len(tags) + 63) // 64)
+        self.masks = np.zeros((len(self.items), words), dtype=np.uint64)
+        for row, item in enumerate(self.items):
+            for tag in item.get("dietary_tags", []):
+                bit = self.tag_bits[tag.lower()]
+                self.masks[row, bit // 64] |= np.uint64(1 << (bit % 64))
+        self.table = pd.DataFrame({
+            "Name": [item["name"] for item in self.items],
+            "Description": [item.get("description", "No description") for item in self.items],
+            "Ingredients": [", ".join(item.get("ingredients", [])) for item in self.items],
+            "Dietary Tags": [", ".join(item.get("dietary_tags", [])) for item in self.items]
+        })
+        self.max_cached_views = max_cached_views
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def _query_mask(self, dietary_preferences):
+        query = np.zeros(self.masks.shape[1], dtype=np.uint64)
+        for preference in dietary_preferences:
+            bit = self.tag_bits.get(preference.lower())
+            if bit is not None:
+                query[bit // 64] |= np.uint64(1 << (bit % 64))
+        return query
+
+    # Boolean row selector; same rule as matches_preferences, evaluated for every item at once
+    def select(self, dietary_preferences):
+        if not dietary_preferences or "No Preference" in dietary_preferences:
+            return np.ones(len(self.items), dtype=bool)
+        return (self.masks & self._query_mask(dietary_preferences)).any(axis=1)
+
+    def rows(self, dietary_preferences):
+        return np.flatnonzero(self.select(dietary_preferences))
+
+    # Display table for a filter, cached so reruns with the same inputs reuse the same frame
+    def display(self, dietary_preferences, portion_size=None, ingredient_swaps=None):
+        key = (frozenset(dietary_preferences or ()), portion_size or "Regular", ingredient_swaps or "None")
+        with self._lock:
+            view = self._views.get(key)
+        if view is not None:
+            return view
+        view = self.table[self.select(dietary_preferences)].assign(**{
+            "Portion Size": key[1],
+            "Custom Ingredients": key[2]
+        })[DISPLAY_COLUMNS].reset_index(drop=True)
+        with self._lock:
+            if len(self._views) >= self.max_cached_views:
+                self._views.pop(next(iter(self._views)))
+            self._views[key] = view
+        return view
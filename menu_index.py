@@ -0,0 +1,147 @@
+import hashlib
+import json
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+# Lowercase, strip accents and punctuation, collapse whitespace
+def normalize(text):
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+def tokenize(text):
+    return normalize(text).split()
+
+def trigrams(text):
+    grams = set()
+    for token in tokenize(text):
+        padded = f"  {token} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+# Rough token estimate (about four characters per token) for prompt budgeting
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+# Keep lines, in order, until the token budget is spent
+def fit_to_budget(lines, token_budget):
+    kept = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if kept and used + cost > token_budget:
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+THEME_KEYWORDS = {
+    "Italian": {"italian", "pasta", "pizza", "risotto", "lasagna", "spaghetti", "penne", "parmesan", "mozzarella", "basil", "pesto", "tiramisu", "gnocchi", "ravioli", "bruschetta", "marinara"},
+    "Mexican": {"mexican", "taco", "tacos", "burrito", "quesadilla", "salsa", "guacamole", "nachos", "enchilada", "tortilla", "jalapeno", "chipotle", "fajita", "churros", "beans"},
+    "Asian": {"asian", "sushi", "ramen", "noodle", "noodles", "rice", "curry", "soy", "tofu", "teriyaki", "dumpling", "gyoza", "kimchi", "pho", "miso", "wok", "thai", "szechuan"},
+    "Desserts": {"dessert", "cake", "pie", "ice", "cream", "chocolate", "tart", "brownie", "cookie", "pudding", "sorbet", "muffin", "sweet", "cheesecake", "donut", "waffle", "pancake"},
+    "Healthy": {"healthy", "salad", "quinoa", "grilled", "steamed", "vegan", "vegetarian", "low", "fresh", "avocado", "kale", "spinach", "bowl", "lean", "greens", "fruit"}
+}
+
+# Same rule as customize_menu: any selected preference present in the item's dietary tags
+def matches_preferences(item, dietary_preferences):
+    if not dietary_preferences or "No Preference" in dietary_preferences:
+        return True
+    tags = {tag.lower() for tag in item.get("dietary_tags", [])}
+    return any(p.lower() in tags for p in dietary_preferences)
+
+# Stable content hash of a menu, used to key per-menu indexes and caches
+def menu_fingerprint(menu_items):
+    payload = json.dumps(menu_items, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# Content hash that is stable across processes; reuses the snapshot's memoized hash when available
+def menu_content_hash(menu_items):
+    return getattr(menu_items, "fingerprint", None) or menu_fingerprint(menu_items)
+
+# Key identifying a menu's contents: the store version when available, else a content hash
+def menu_key(menu_items):
+    version = getattr(menu_items, "version", None)
+    return f"v{version}" if version is not None else menu_fingerprint(menu_items)
+
+# Inverted index over menu names, descriptions and ingredients for fuzzy dish lookup
+class MenuIndex:
+    def __init__(self, menu_items):
+        self.items = list(menu_items)
+        self.exact = {}
+        self.name_trigrams = []
+        self.name_tokens = []
+        self.trigram_postings = defaultdict(set)
+        self.token_postings = defaultdict(set)
+        self.item_tokens = []
+        for idx, item in enumerate(self.items):
+            name = item.get("name", "")
+            self.exact.setdefault(normalize(name), idx)
+            grams = trigrams(name)
+            self.name_trigrams.append(grams)
+            self.name_tokens.append(set(tokenize(name)))
+            for gram in grams:
+                self.trigram_postings[gram].add(idx)
+            text = " ".join([item.get("description", "")] + list(item.get("ingredients", [])))
+            for token in set(tokenize(text)) | self.name_tokens[idx]:
+                self.token_postings[token].add(idx)
+            self.item_tokens.append(set(tokenize(text + " " + name + " " + " ".join(item.get("dietary_tags", [])))))
+
+    # Ranked (score, item) pairs; score is 1.0 for an exact name match and in [0, 1) otherwise
+    def search(self, query, limit=5):
+        normalized = normalize(query)
+        if not normalized:
+            return []
+        if normalized in self.exact:
+            idx = self.exact[normalized]
+            ranked = [(1.0, self.items[idx])]
+            return ranked + [pair for pair in self._fuzzy(normalized, limit) if pair[1] is not self.items[idx]][:limit - 1]
+        return self._fuzzy(normalized, limit)
+
+    def _fuzzy(self, normalized, limit):
+        return [(score, self.items[idx]) for score, idx in self._scored(normalized)[:limit]]
+
+    # (score, item index) pairs for every candidate sharing a trigram or token with the query, best first
+    def _scored(self, normalized):
+        query_grams = trigrams(normalized)
+        query_tokens = set(normalized.split())
+        shared = Counter()
+        for gram in query_grams:
+            for idx in self.trigram_postings.get(gram, ()):
+                shared[idx] += 1
+        token_hits = Counter()
+        for token in query_tokens:
+            for idx in self.token_postings.get(token, ()):
+                token_hits[idx] += 1
+        scored = []
+        for idx in set(shared) | set(token_hits):
+            name_grams = self.name_trigrams[idx]
+            common = shared.get(idx, 0)
+            jaccard = common / (len(query_grams) + len(name_grams) - common) if name_grams else 0.0
+            coverage = common / len(name_grams) if name_grams else 0.0
+            score = 0.5 * jaccard + 0.4 * coverage + 0.1 * min(1.0, token_hits.get(idx, 0) / len(query_tokens))
+            # The whole menu name appears in the query, e.g. "This looks like Margherita Pizza"
+            if self.name_tokens[idx] and self.name_tokens[idx] <= query_tokens:
+                score = max(score, 0.9 + 0.01 * min(len(self.name_tokens[idx]), 8))
+            scored.append((min(score, 0.99), idx))
+        scored.sort(key=lambda pair: (-pair[0], pair[1]))
+        return scored
+
+    # Top-k items most relevant to a detected dish, dietary preferences and/or theme, for prompt building
+    def retrieve(self, query=None, dietary_preferences=None, theme=None, k=25):
+        similarity = {}
+        if query:
+            for score, idx in self._scored(normalize(query)):
+                similarity[idx] = score
+        keywords = THEME_KEYWORDS.get(theme, set(tokenize(theme))) if theme else set()
+        filtering = dietary_preferences and "No Preference" not in dietary_preferences
+        ranked = []
+        for idx, item in enumerate(self.items):
+            score = similarity.get(idx, 0.0)
+            if filtering and matches_preferences(item, dietary_preferences):
+                score += 1.0
+            if keywords:
+                score += min(1.0, len(keywords & self.item_tokens[idx]) / 2)
+            ranked.append((-score, idx))
+        ranked.sort()
+        return [self.items[idx] for _, idx in ranked[:k]]
@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from google.cloud.firestore_v1.base_query import FieldFilter
+from menu_index import menu_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Immutable-by-convention menu list tagged with the store version it was built from
+class MenuSnapshot(list):
+    def __init__(self, items, version):
+        super().__init__(items)
+        self.version = version
+        self._fingerprint = None
+
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            self._fingerprint = menu_fingerprint(list(self))
+        return self._fingerprint
+
+# Process-wide mirror of the Firestore menu collection. One full load, then kept current either
+# by a snapshot listener (deltas pushed by Firestore) or by polling documents whose updated_at moved.
+# Polling also does a full reload every full_reload_interval seconds to see hard deletes, and on every
+# refresh when the documents carry no updated_at at all.
+class MenuStore:
+    def __init__(self, db, collection="menu", listen=True, refresh_interval=60, load_timeout=30, full_reload_interval=600):
+        self._collection = db.collection(collection)
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._docs = {}
+        self._snapshot = MenuSnapshot([], 0)
+        self._watch = None
+        self._last_refresh = 0.0
+        self._last_full_load = 0.0
+        self._last_updated_at = None
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self.version = 0
+        self.error = None
+        if listen and hasattr(self._collection, "on_snapshot"):
+            self._watch = self._collection.on_snapshot(self._on_snapshot)
+            if not self._loaded.wait(load_timeout):
+                self._watch.unsubscribe()
+                self._watch = None
+                raise TimeoutError("Timed out waiting for the initial menu snapshot.")
+        else:
+            self._apply({doc.id: doc.to_dict() for doc in self._collection.stream()}, [])
+            self._last_refresh = self._last_full_load = time.monotonic()
+            if self._last_updated_at is None:
+                logger.warning("Menu documents have no updated_at; polling falls back to a full reload every %ss", refresh_interval)
+        if self.error:
+            raise self.error
+
+    # Listener callback, runs on Firestore's watch thread; the first call carries the full collection
+    def _on_snapshot(self, col_snapshot, changes, read_time):
+        try:
+            upserts = {}
+            removed = []
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    removed.append(change.document.id)
+                else:
+                    upserts[change.document.id] = change.document.to_dict()
+            self._apply(upserts, removed)
+        except Exception as e:
+            logger.exception("Failed to apply menu snapshot")
+            self.error = e
+        finally:
+            self._loaded.set()
+
+    def _apply(self, upserts, removed):
+        if not upserts and not removed and self.version:
+            return
+        with self._lock:
+            self._docs.update(upserts)
+            for doc_id in removed:
+                self._docs.pop(doc_id, None)
+            for doc_id, data in upserts.items():
+                if data.get("deleted"):
+                    self._docs.pop(doc_id, None)
+                updated_at = data.get("updated_at")
+                if updated_at is not None and (self._last_updated_at is None or updated_at > self._last_updated_at):
+                    self._last_updated_at = updated_at
+            self.version += 1
+            self._snapshot = MenuSnapshot([{"id": doc_id, **data} for doc_id, data in self._docs.items()], self.version)
+        logger.info("Menu store at version %d (%d items, %d upserted, %d removed)", self.version, len(self._snapshot), len(upserts), len(removed))
+
+    # Polling mode: fetch only documents whose updated_at is newer than the newest one seen.
+    # Soft deletes (deleted=True) arrive with the delta; hard deletes wait for the next full reload.
+    def refresh(self):
+        self._last_refresh = time.monotonic()
+        if self._last_updated_at is None or self._last_refresh - self._last_full_load >= self.full_reload_interval:
+            self.reload()
+            return
+        query = self._collection.where(filter=FieldFilter("updated_at", ">", self._last_updated_at))
+        upserts = {doc.id: doc.to_dict() for doc in query.stream()}
+        if upserts:
+            self._apply(upserts, [])
+
+    # Read the whole collection and apply only what differs from the mirror, removals included
+    def reload(self):
+        docs = {doc.id: doc.to_dict() for doc in self._collection.stream()}
+        with self._lock:
+            upserts = {
+                doc_id: data for doc_id, data in docs.items()
+                if self._docs.get(doc_id) != data and not (data.get("deleted") and doc_id not in self._docs)
+            }
+            removed = [doc_id for doc_id in self._docs if doc_id not in docs]
+        self._apply(upserts, removed)
+        self._last_full_load = time.monotonic()
+
+    def items(self):
+        if self._watch is None and time.monotonic() - self._last_refresh >= self.refresh_interval:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Menu delta refresh failed; serving version %d", self.version)
+        return self._snapshot
+
+    def close(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
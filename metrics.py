@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = tuple(4 ** exponent for exponent in range(13))
+
+# Cumulative-style histogram over fixed upper bounds, plus an overflow bucket
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    # Estimated quantile, interpolating linearly inside the bucket that holds it
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+class _Span:
+    def __init__(self):
+        self.values = {}
+        self.cache_result = None
+
+    # Record a numeric measurement for this span (bytes, prompt_tokens, items, ...)
+    def set(self, name, value):
+        if value is not None:
+            self.values[name] = value
+
+    def cache(self, hit):
+        self.cache_result = "hit" if hit else "miss"
+
+# Stand-in for spans that were not sampled: same interface, records nothing
+class _NullSpan:
+    def set(self, name, value):
+        pass
+
+    def cache(self, hit):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+# Process-wide stage metrics: a latency histogram per stage, a histogram per named measurement
+# (payload bytes, tokens, ...) and cache hit/miss and error counters. Only `sample_rate` of spans are
+# recorded, so counts are of sampled spans; durations and quantiles are unaffected by sampling.
+class Metrics:
+    def __init__(self, sample_rate=1.0, latency_buckets=LATENCY_BUCKETS, size_buckets=SIZE_BUCKETS):
+        self.sample_rate = sample_rate
+        self.latency_buckets = latency_buckets
+        self.size_buckets = size_buckets
+        self.durations = {}
+        self.values = {}
+        self.cache = {}
+        self.errors = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def sampled(self):
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    @contextmanager
+    def span(self, stage, **values):
+        if not self.sampled():
+            yield _NULL_SPAN
+            return
+        span = _Span()
+        for name, value in values.items():
+            span.set(name, value)
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield span
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._record(stage, time.perf_counter() - started, span.values, span.cache_result, failed)
+
+    # Record an already-timed operation (subject to sampling like a span)
+    def observe(self, stage, seconds, cache_hit=None, failed=False, **values):
+        if self.sampled():
+            self._record(stage, seconds, {k: v for k, v in values.items() if v is not None},
+                         None if cache_hit is None else ("hit" if cache_hit else "miss"), failed)
+
+    def _record(self, stage, seconds, values, cache_result, failed):
+        with self._lock:
+            if stage not in self.durations:
+                self.durations[stage] = Histogram(self.latency_buckets)
+            self.durations[stage].observe(seconds)
+            for name, value in values.items():
+                key = (stage, name)
+                if key not in self.values:
+                    self.values[key] = Histogram(self.size_buckets)
+                self.values[key].observe(value)
+            if cache_result:
+                key = (stage, cache_result)
+                self.cache[key] = self.cache.get(key, 0) + 1
+            if failed:
+                self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    # One row per stage: sampled count, latency quantiles (ms), mean of each measurement, cache hit rate
+    def summary(self):
+        with self._lock:
+            rows = []
+            for stage, histogram in sorted(self.durations.items()):
+                row = {
+                    "stage": stage,
+                    "count": histogram.count,
+                    "errors": self.errors.get(stage, 0),
+                    "p50_ms": round(histogram.quantile(0.5) * 1000, 1),
+                    "p95_ms": round(histogram.quantile(0.95) * 1000, 1),
+                    "p99_ms": round(histogram.quantile(0.99) * 1000, 1),
+                    "mean_ms": round(histogram.sum / histogram.count * 1000, 1)
+                }
+                for (value_stage, name), values in sorted(self.values.items()):
+                    if value_stage == stage:
+                        row[f"mean_{name}"] = round(values.sum / values.count, 1)
+                hits = self.cache.get((stage, "hit"), 0)
+                misses = self.cache.get((stage, "miss"), 0)
+                if hits or misses:
+                    row["cache_hit_rate"] = round(hits / (hits + misses), 3)
+                rows.append(row)
+            return rows
+
+    def to_dict(self):
+        with self._lock:
+            def histogram_dict(histogram):
+                return {"buckets": list(histogram.buckets), "counts": list(histogram.counts), "count": histogram.count, "sum": histogram.sum}
+            return {
+                "sample_rate": self.sample_rate,
+                "uptime_seconds": round(time.time() - self.started, 1),
+                "durations": {stage: histogram_dict(h) for stage, h in self.durations.items()},
+                "values": {f"{stage}.{name}": histogram_dict(h) for (stage, name), h in self.values.items()},
+                "cache": {f"{stage}.{result}": count for (stage, result), count in self.cache.items()},
+                "errors": dict(self.errors)
+            }
+
+    # Prometheus text exposition format (version 0.0.4)
+    def prometheus(self, prefix="yash"):
+        lines = []
+
+        def histogram_lines(metric, labels, histogram):
+            cumulative = 0
+            bounds = [str(bound) for bound in histogram.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+
+        with self._lock:
+            lines.append(f"# HELP {prefix}_stage_duration_seconds Time spent per request stage (sampled).")
+            lines.append(f"# TYPE {prefix}_stage_duration_seconds histogram")
+            for stage, histogram in sorted(self.durations.items()):
+                histogram_lines(f"{prefix}_stage_duration_seconds", f'stage="{stage}"', histogram)
+            for name in sorted({name for _, name in self.values}):
+                metric = f"{prefix}_stage_{name}"
+                lines.append(f"# HELP {metric} Per-stage {name.replace('_', ' ')} (sampled).")
+                lines.append(f"# TYPE {metric} histogram")
+                for (stage, value_name), histogram in sorted(self.values.items()):
+                    if value_name == name:
+                        histogram_lines(metric, f'stage="{stage}"', histogram)
+            lines.append(f"# HELP {prefix}_cache_requests_total Cache lookups per stage and result (sampled).")
+            lines.append(f"# TYPE {prefix}_cache_requests_total counter")
+            for (stage, result), count in sorted(self.cache.items()):
+                lines.append(f'{prefix}_cache_requests_total{{stage="{stage}",result="{result}"}} {count}')
+            lines.append(f"# HELP {prefix}_stage_errors_total Failed stage executions (sampled).")
+            lines.append(f"# TYPE {prefix}_stage_errors_total counter")
+            for stage, count in sorted(self.errors.items()):
+                lines.append(f'{prefix}_stage_errors_total{{stage="{stage}"}} {count}')
+            lines.append(f"# HELP {prefix}_metrics_sample_rate Fraction of spans recorded.")
+            lines.append(f"# TYPE {prefix}_metrics_sample_rate gauge")
+            lines.append(f"{prefix}_metrics_sample_rate {self.sample_rate}")
+        return "\n".join(lines) + "\n"
+
+    # Write the metrics to path atomically: Prometheus text for .prom/.txt files (e.g. for the
+    # node_exporter textfile collector), JSON otherwise
+    def write(self, path):
+        text = self.prometheus() if path.endswith((".prom", ".txt")) else json.dumps(self.to_dict(), indent=2)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(temporary, path)
+
+    # Rewrite the metrics file every `interval` seconds on a daemon thread
+    def export_periodically(self, path, interval=15):
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write(path)
+                except Exception:
+                    logger.exception("Writing metrics to %s failed", path)
+        threading.Thread(target=run, name="metrics-export", daemon=True).start()
@@ -0,0 +1,66 @@
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, wait
+from resilience import DeadlineExceeded
+
+# A named unit of work; fn is called with the results of its dependencies as keyword arguments
+Stage = namedtuple("Stage", ["name", "fn", "deps"], defaults=[()])
+
+StageResult = namedtuple("StageResult", ["name", "value", "error", "elapsed"])
+
+class DependencyFailed(Exception):
+    pass
+
+# Runs stages on the given executor as soon as their dependencies are done, all under one deadline.
+# Yields a StageResult per stage in completion order, so callers can render each section as it lands.
+def run_pipeline(stages, executor, timeout):
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [dep for dep in stage.deps if dep not in by_name]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {', '.join(missing)}")
+    deadline = time.monotonic() + timeout
+    results = {}
+    waiting = list(stages)
+    running = {}
+
+    def submit_ready():
+        for stage in list(waiting):
+            failed = [dep for dep in stage.deps if dep in results and results[dep].error is not None]
+            if failed:
+                waiting.remove(stage)
+                result = StageResult(stage.name, None, DependencyFailed(f"{stage.name} skipped: {', '.join(failed)} failed"), 0.0)
+                results[stage.name] = result
+                yield result
+            elif all(dep in results for dep in stage.deps):
+                waiting.remove(stage)
+                kwargs = {dep: results[dep].value for dep in stage.deps}
+                started = time.monotonic()
+                running[executor.submit(stage.fn, **kwargs)] = (stage, started)
+
+    while True:
+        # Skipping a stage can unblock (or skip) others, so settle before waiting
+        settled = list(submit_ready())
+        while settled:
+            yield from settled
+            settled = list(submit_ready())
+        if not running:
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            stage, started = running.pop(future)
+            try:
+                result = StageResult(stage.name, future.result(), None, time.monotonic() - started)
+            except Exception as e:
+                result = StageResult(stage.name, None, e, time.monotonic() - started)
+            results[stage.name] = result
+            yield result
+
+    for future, (stage, started) in running.items():
+        future.cancel()
+        yield StageResult(stage.name, None, DeadlineExceeded(f"{stage.name} did not finish within {timeout:g}s"), time.monotonic() - started)
+    for stage in waiting:
+        yield StageResult(stage.name, None, DeadlineExceeded(f"{stage.name} did not start within {timeout:g}s"), 0.0)
@@ -0,0 +1,81 @@
+from google.cloud import vision
+from resilience import CircuitOpen, DeadlineExceeded
+
+# UI-free recognition steps shared by the Streamlit app and the batch runner
+
+MAX_LABELS = 5
+
+# Message of a match settled locally because Gemini could not break the tie; callers should not cache it
+DEGRADED_MATCH_MESSAGE = "Similar dish found (best local guess; the menu assistant is unavailable)."
+
+# Top labels as (description, score) pairs
+def labels_from_response(response, max_labels=MAX_LABELS):
+    return [(label.description, label.score) for label in response.label_annotations][:max_labels]
+
+def label_image(vision_client, image_content, max_labels=MAX_LABELS):
+    response = vision_client.label_detection(image=vision.Image(content=image_content))
+    return labels_from_response(response, max_labels)
+
+# One Vision label-detection request, for use with batch_annotate_images
+def label_request(image_content, max_labels=MAX_LABELS):
+    return vision.AnnotateImageRequest(
+        image=vision.Image(content=image_content),
+        features=[vision.Feature(type_=vision.Feature.Type.LABEL_DETECTION, max_results=max_labels)]
+    )
+
+# Dish name for scored labels; a confident LabelMemo entry skips the Gemini call entirely
+def name_dish(model, labels, memo=None):
+    if not labels:
+        return "Unknown dish"
+    if memo is not None:
+        remembered = memo.lookup(labels)
+        if remembered is not None:
+            return remembered
+    prompt = f"Based on the following labels from an image, identify the most likely dish: {', '.join(label for label, _ in labels)}"
+    response = model.generate_content(prompt)
+    dish_name = response.text.strip()
+    if memo is not None:
+        memo.remember(labels, dish_name)
+    return dish_name
+
+# Match a dish name to the menu: local fuzzy index first, Gemini only to break ties between ambiguous candidates
+# (falling back to the top candidate when Gemini is unavailable).
+# Returns (item or None, message, confidence).
+def match_dish(model, index, dish_name, menu_items, candidates=10, min_score=0.5, min_margin=0.15):
+    if not menu_items:
+        return None, "No menu items found in the database.", 0.0
+    ranked = index.search(dish_name, limit=candidates)
+    if ranked:
+        top_score, top_item = ranked[0]
+        runner_up = ranked[1][0] if len(ranked) > 1 else 0.0
+        if top_score == 1.0:
+            return top_item, "Exact match found!", top_score
+        if top_score >= min_score and top_score - runner_up >= min_margin:
+            return top_item, "Similar dish found!", top_score
+    # Only the top candidates go to Gemini; a dish that resembles nothing on the menu is answered locally
+    shortlist = [item for score, item in ranked if score > 0.1]
+    if not shortlist:
+        return None, "No close match found in the menu.", 0.0
+    menu_text = "\n".join([f"- {item['name']}: {item.get('description', '')}" for item in shortlist])
+    prompt = f"""
+    Given the dish '{dish_name}', find the most similar or exact match from the following menu:
+    {menu_text}
+    Return the name of the matching dish or suggest a similar one if no exact match is found.
+    If no close match exists, return 'No close match found'.
+    """
+    try:
+        response = model.generate_content(prompt)
+    except (CircuitOpen, DeadlineExceeded):
+        # Gemini unavailable or out of time: settle for the best local candidate if it is good enough
+        if ranked and ranked[0][0] >= min_score:
+            return ranked[0][1], DEGRADED_MATCH_MESSAGE, ranked[0][0]
+        raise
+    match = response.text.strip()
+    resolved = index.search(match, limit=1) if match != "No close match found" else []
+    if resolved:
+        score, item = resolved[0]
+        if score == 1.0:
+            return item, "Exact match found!", score
+        if score >= min_score:
+            return item, "Similar dish found!", score
+    return None, match if match != "No close match found" else "No close match found in the menu.", 0.0
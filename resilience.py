@@ -0,0 +1,158 @@
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from google.api_core import exceptions as api_exceptions
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+class CircuitOpen(Exception):
+    pass
+
+# Overall time budget for one user request, shared by every stage and call made on its behalf
+class Deadline:
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+@contextmanager
+def deadline_scope(deadline):
+    token = current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        current_deadline.reset(token)
+
+def remaining_budget(default=None):
+    deadline = current_deadline.get()
+    return default if deadline is None else deadline.remaining()
+
+TRANSIENT_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.InternalServerError,
+    api_exceptions.GatewayTimeout,
+    api_exceptions.DeadlineExceeded,
+    ConnectionError,
+    TimeoutError
+)
+
+def is_transient(error):
+    return isinstance(error, TRANSIENT_ERRORS) and not isinstance(error, (DeadlineExceeded, CircuitOpen))
+
+# Retry transient failures with full-jitter exponential backoff, but only while the deadline
+# leaves room for the backoff plus another attempt of typical duration
+def call_with_retries(fn, deadline=None, attempts=3, base_delay=0.25, max_delay=2.0, typical_duration=0.0):
+    for attempt in range(attempts):
+        if deadline is not None and deadline.expired:
+            raise DeadlineExceeded("Request budget exhausted")
+        try:
+            return fn()
+        except Exception as e:
+            if not is_transient(e) or attempt == attempts - 1:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            if deadline is not None and deadline.remaining() < delay + typical_duration:
+                raise
+            time.sleep(delay)
+
+# Recent call durations, for p95-based hedging delays
+class LatencyTracker:
+    def __init__(self, window=200, min_samples=20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p):
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+# Run fn on the executor; if it has not finished after hedge_after seconds, race a second copy
+# and return whichever succeeds first
+def hedged_call(fn, executor, hedge_after, timeout=None, on_hedge=None):
+    primary = executor.submit(fn)
+    done, _ = wait([primary], timeout=hedge_after if timeout is None else min(hedge_after, timeout))
+    if done:
+        return primary.result()
+    futures = [primary, executor.submit(fn)]
+    if on_hedge:
+        on_hedge()
+    deadline = None if timeout is None else time.monotonic() + max(0.0, timeout - hedge_after)
+    error = None
+    while futures:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        done, pending = wait(futures, timeout=remaining, return_when=FIRST_COMPLETED)
+        if not done:
+            raise DeadlineExceeded("Hedged call did not finish within the request budget")
+        for future in done:
+            try:
+                return future.result()
+            except Exception as e:
+                error = e
+        futures = list(pending)
+    raise error
+
+# Closed -> open after `failure_threshold` consecutive failures; after `reset_timeout` one probe
+# call is let through (half-open) and its outcome closes or re-opens the circuit
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout or self.probing:
+                raise CircuitOpen(f"{self.name} is temporarily unavailable")
+            self.probing = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    # The call never reached the API (local deadline or rate limit): no verdict, but free the probe slot
+    def release_probe(self):
+        with self._lock:
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
@@ -0,0 +1,261 @@
+import argparse
+import asyncio
+import base64
+import binascii
+import contextvars
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from PIL import UnidentifiedImageError
+from gateway import RateLimitExceeded
+from recognition import DEGRADED_MATCH_MESSAGE
+from resilience import CircuitOpen, Deadline, DeadlineExceeded, deadline_scope
+
+logger = logging.getLogger(__name__)
+
+# JSON HTTP API over the engine, for POS integrations and anything else that is not the Streamlit UI.
+#   POST /v1/recognize     image bytes (raw body, multipart field "image", or JSON {"image_base64"}) -> dish and menu match
+#   POST /v1/match         {"dish"} -> menu match
+#   POST /v1/recommend     {"dish", "preferences"} -> recommendations
+#   POST /v1/menu/filter   {"preferences", "portion_size", "ingredient_swaps"} -> menu items
+#   GET  /healthz, GET /metrics (Prometheus text)
+# Engine calls block, so they run on a bounded thread pool, each under a request deadline. At most
+# max_concurrency requests run at once and at most max_queue wait; beyond that requests get 503 immediately.
+
+class Overloaded(Exception):
+    pass
+
+# Admission control: a fixed number of running requests plus a bounded wait queue
+class Backpressure:
+    def __init__(self, max_concurrency, max_queue):
+        self.max_queue = max_queue
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def acquire(self):
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(f"{self.waiting} requests already waiting")
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+
+    def release(self):
+        self.running -= 1
+        self._slots.release()
+
+class Service:
+    def __init__(self, engine, max_concurrency=32, max_queue=128, request_timeout=10):
+        self.engine = engine
+        self.request_timeout = request_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="service")
+        self.backpressure = Backpressure(max_concurrency, max_queue)
+
+    # Run a blocking engine call on the pool under a fresh request deadline. The slot is held until the
+    # worker thread finishes, not just until the client is answered, so work abandoned on timeout still
+    # counts against max_concurrency and a slow upstream sheds load with 503s instead of queueing unboundedly.
+    async def run(self, fn, *args, **kwargs):
+        deadline = Deadline(self.request_timeout)
+        def call():
+            with deadline_scope(deadline):
+                return fn(*args, **kwargs)
+        def finished(future):
+            self.backpressure.release()
+            if not future.cancelled():
+                future.exception()
+        await self.backpressure.acquire()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, contextvars.copy_context().run, call)
+        except BaseException:
+            self.backpressure.release()
+            raise
+        future.add_done_callback(finished)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), deadline.remaining() + 1)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Request did not finish within {self.request_timeout:g}s")
+
+SERVICE_KEY = web.AppKey("service", Service)
+
+def _json(data, status=200, headers=None):
+    return web.json_response(data, status=status, headers=headers, dumps=lambda value: json.dumps(value, default=str))
+
+def _error(status, message, headers=None):
+    return _json({"error": message}, status=status, headers=headers)
+
+@web.middleware
+async def errors(request, handler):
+    started = time.perf_counter()
+    try:
+        response = await handler(request)
+    except web.HTTPException:
+        raise
+    except Overloaded as e:
+        response = _error(503, f"Server busy: {str(e)}", headers={"Retry-After": "1"})
+    except (CircuitOpen, RateLimitExceeded) as e:
+        response = _error(503, str(e), headers={"Retry-After": "5"})
+    except (DeadlineExceeded, TimeoutError) as e:
+        response = _error(504, str(e) or "Request timed out")
+    except UnidentifiedImageError:
+        response = _error(400, "Upload is not a readable image")
+    except ValueError as e:
+        response = _error(400, str(e))
+    except Exception as e:
+        logger.exception("Unhandled error on %s", request.path)
+        response = _error(500, f"Internal error: {str(e)}")
+    resource = request.match_info.route.resource
+    request.app[SERVICE_KEY].engine.metrics.observe(
+        f"http {request.method} {resource.canonical if resource else request.path}",
+        time.perf_counter() - started,
+        failed=response.status >= 500
+    )
+    return response
+
+async def _json_body(request):
+    if not request.can_read_body:
+        return {}
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        raise ValueError("Request body must be JSON")
+    if not isinstance(body, dict):
+        raise ValueError("Request body must be a JSON object")
+    return body
+
+def _preferences(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(",") if item.strip()]
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return value
+    raise ValueError("preferences must be a list of strings or a comma-separated string")
+
+def _required_text(body, key):
+    value = body.get(key)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"'{key}' is required")
+    return value.strip()
+
+async def _image_bytes(request):
+    if request.content_type.startswith("multipart/"):
+        async for part in await request.multipart():
+            if part.name == "image":
+                return await part.read()
+        raise ValueError("Multipart upload needs an 'image' field")
+    if request.content_type == "application/json":
+        try:
+            return base64.b64decode(_required_text(await _json_body(request), "image_base64"), validate=True)
+        except binascii.Error:
+            raise ValueError("image_base64 is not valid base64")
+    return await request.read()
+
+def _match_json(match, message, confidence):
+    return {"match": match, "message": message, "confidence": round(confidence, 4), "degraded": message == DEGRADED_MATCH_MESSAGE}
+
+# Prepare the upload, detect the dish and (unless match=false) match it against the current menu
+async def recognize(request):
+    service = request.app[SERVICE_KEY]
+    engine = service.engine
+    image = await _image_bytes(request)
+    if not image:
+        raise ValueError("No image uploaded")
+    with_match = request.query.get("match", "true").lower() not in ("0", "false", "no")
+
+    def work():
+        prepared = engine.prepare(image)
+        detection = engine.detect_dish(prepared.content)
+        result = {"dish": detection.dish, "cached": detection.cached, "degraded": detection.degraded}
+        if with_match:
+            matched = _match_json(*engine.match_dish(detection.dish, engine.menu()))
+            result.update(matched, degraded=detection.degraded or matched["degraded"])
+        return result
+
+    return _json(await service.run(work))
+
+async def match(request):
+    service = request.app[SERVICE_KEY]
+    dish = _required_text(await _json_body(request), "dish")
+    return _json(_match_json(*await service.run(lambda: service.engine.match_dish(dish, service.engine.menu()))))
+
+async def recommend(request):
+    service = request.app[SERVICE_KEY]
+    body = await _json_body(request)
+    dish = _required_text(body, "dish")
+    preferences = _preferences(body.get("preferences"))
+    suggestions = await service.run(lambda: service.engine.recommend(dish, service.engine.menu(), preferences))
+    return _json({"recommendations": suggestions.text, "cached": suggestions.cached, "degraded": suggestions.degraded})
+
+async def filter_menu(request):
+    service = request.app[SERVICE_KEY]
+    body = await _json_body(request)
+    preferences = _preferences(body.get("preferences"))
+    items = await service.run(
+        lambda: service.engine.customize_menu(service.engine.menu(), preferences, body.get("portion_size"), body.get("ingredient_swaps"))
+    )
+    return _json({"count": len(items), "items": items})
+
+async def health(request):
+    service = request.app[SERVICE_KEY]
+    backpressure = service.backpressure
+    return _json({
+        "status": "ok",
+        "running": backpressure.running,
+        "waiting": backpressure.waiting,
+        "rejected": backpressure.rejected,
+        "gateway": service.engine.clients.gateway.stats() if service.engine.clients.gateway else None
+    })
+
+async def metrics(request):
+    return web.Response(text=request.app[SERVICE_KEY].engine.metrics.prometheus(), content_type="text/plain", charset="utf-8")
+
+def create_app(engine, max_concurrency=32, max_queue=128, request_timeout=10, max_upload_bytes=20 * 1024 * 1024):
+    app = web.Application(middlewares=[errors], client_max_size=max_upload_bytes)
+    service = Service(engine, max_concurrency, max_queue, request_timeout)
+    app[SERVICE_KEY] = service
+    app.router.add_post("/v1/recognize", recognize)
+    app.router.add_post("/v1/match", match)
+    app.router.add_post("/v1/recommend", recommend)
+    app.router.add_post("/v1/menu/filter", filter_menu)
+    app.router.add_get("/healthz", health)
+    app.router.add_get("/metrics", metrics)
+
+    async def shutdown(app):
+        service.executor.shutdown(wait=False, cancel_futures=True)
+    app.on_cleanup.append(shutdown)
+    return app
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve dish recognition and menu APIs over HTTP.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--secrets", default=os.path.join(".streamlit", "secrets.toml"), help="Path to secrets.toml with API credentials")
+    parser.add_argument("--max-concurrency", type=int, default=32, help="Requests processed at once")
+    parser.add_argument("--max-queue", type=int, default=128, help="Requests allowed to wait before new ones get 503")
+    parser.add_argument("--timeout", type=float, default=10, help="Per-request deadline in seconds")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    from engine import Engine, load_secrets
+    engine = Engine.from_secrets(load_secrets(args.secrets))
+    # Load the menu before accepting traffic so the first requests do not pay for it
+    engine.menu()
+    web.run_app(
+        create_app(engine, args.max_concurrency, args.max_queue, args.timeout),
+        host=args.host,
+        port=args.port,
+        keepalive_timeout=75
+    )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
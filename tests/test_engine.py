@@ -0,0 +1,29 @@
+import pytest
+from engine import Engine
+from fakes import FakeLabelResponse
+from resilience import CircuitOpen
+
+class FixedVision:
+    def __init__(self, labels):
+        self.labels = labels
+
+    def label_detection(self, image, **kwargs):
+        return FakeLabelResponse([type("Label", (), {"description": label, "score": 0.9})() for label in self.labels])
+
+class UnavailableModel:
+    def generate_content(self, prompt, **kwargs):
+        raise CircuitOpen("gemini is temporarily unavailable")
+
+class FakeClients:
+    def __init__(self, labels):
+        self.vision = FixedVision(labels)
+        self.gemini = UnavailableModel()
+
+def test_open_circuit_falls_back_to_first_specific_label():
+    detection = Engine(FakeClients(["Food", "Pizza", "Cheese"])).detect_dish(b"image")
+    assert detection.dish == "Pizza"
+    assert detection.degraded
+
+def test_open_circuit_with_only_generic_labels_raises():
+    with pytest.raises(CircuitOpen):
+        Engine(FakeClients(["Food", "Dish", "Recipe"])).detect_dish(b"image")
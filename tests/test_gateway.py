@@ -0,0 +1,85 @@
+import time
+import pytest
+from google.api_core import exceptions as api_exceptions
+from engine import DEGRADED_NOTE, Engine
+from gateway import GatedModel, Gateway, RateLimitExceeded
+from resilience import CircuitOpen, Deadline, DeadlineExceeded, deadline_scope
+
+def make_gateway(rate=1000, burst=1000, **kwargs):
+    kwargs.setdefault("retry_attempts", 1)
+    kwargs.setdefault("breaker_threshold", 3)
+    return Gateway({"gemini": (rate, burst, 4)}, max_workers=2, **kwargs)
+
+def unavailable():
+    raise api_exceptions.ServiceUnavailable("down")
+
+def fail(gateway, times):
+    for _ in range(times):
+        with pytest.raises(api_exceptions.ServiceUnavailable):
+            gateway.run("gemini", unavailable)
+
+def test_expired_budget_does_not_reset_failures():
+    gateway = make_gateway()
+    fail(gateway, 2)
+    calls = []
+    with deadline_scope(Deadline(0)):
+        with pytest.raises(DeadlineExceeded):
+            gateway.run("gemini", lambda: calls.append(1))
+    assert calls == []
+    assert gateway.breakers["gemini"].failures == 2
+    fail(gateway, 1)
+    assert gateway.breakers["gemini"].state == "open"
+
+def test_expired_budget_probe_keeps_circuit_open():
+    gateway = make_gateway(breaker_reset=0.05)
+    fail(gateway, 3)
+    time.sleep(0.1)
+    breaker = gateway.breakers["gemini"]
+    assert breaker.state == "half-open"
+    with deadline_scope(Deadline(0)):
+        with pytest.raises(DeadlineExceeded):
+            gateway.run("gemini", lambda: "never called")
+    assert breaker.state == "half-open"
+    # The probe slot was released, so the next call gets to probe and closes the circuit
+    assert gateway.run("gemini", lambda: "ok") == "ok"
+    assert breaker.state == "closed"
+
+def test_rate_limit_does_not_reset_failures():
+    gateway = make_gateway(rate=0.001, burst=2, acquire_timeout=0.01)
+    fail(gateway, 2)
+    with pytest.raises(RateLimitExceeded):
+        gateway.run("gemini", lambda: "rate limited")
+    assert gateway.breakers["gemini"].failures == 2
+
+def test_api_error_counts_as_healthy_response():
+    gateway = make_gateway()
+    fail(gateway, 2)
+    def invalid():
+        raise api_exceptions.InvalidArgument("bad prompt")
+    with pytest.raises(api_exceptions.InvalidArgument):
+        gateway.run("gemini", invalid)
+    assert gateway.breakers["gemini"].failures == 0
+
+def test_open_circuit_fails_fast():
+    gateway = make_gateway()
+    fail(gateway, 3)
+    with pytest.raises(CircuitOpen):
+        gateway.run("gemini", lambda: "never called")
+
+class ExhaustedModel:
+    def generate_content(self, prompt, stream=False, **kwargs):
+        raise api_exceptions.ResourceExhausted("quota")
+
+class FakeClients:
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self.gemini = GatedModel(ExhaustedModel(), gateway)
+
+@pytest.mark.parametrize("gateway_kwargs", [{}, {"rate": 0.001, "burst": 0.5, "acquire_timeout": 0.01}])
+def test_suggestions_degrade_under_quota_pressure(gateway_kwargs):
+    engine = Engine(FakeClients(make_gateway(**gateway_kwargs)))
+    menu = [{"id": "1", "name": "Margherita Pizza", "description": "Tomato and basil", "dietary_tags": ["Vegetarian"]}]
+    suggestions = engine.recommend("Pizza", menu, [])
+    assert suggestions.degraded
+    assert suggestions.text.startswith(DEGRADED_NOTE)
+    assert "Margherita Pizza" in suggestions.text
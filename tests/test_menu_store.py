@@ -0,0 +1,51 @@
+import logging
+from fakes import FakeFirestore, Latency, synthetic_menu
+from menu_store import MenuStore
+
+def make_store(menu_items, **kwargs):
+    db = FakeFirestore(menu_items, Latency(0))
+    kwargs.setdefault("refresh_interval", 0)
+    return db, MenuStore(db, listen=False, **kwargs)
+
+def names(store):
+    return {item["id"]: item["name"] for item in store.items()}
+
+def test_delta_refresh_reads_only_changed_documents():
+    db, store = make_store(synthetic_menu(20))
+    reads = db.collection("menu").reads
+    db.touch("item-3", name="Renamed Dish")
+    assert names(store)["item-3"] == "Renamed Dish"
+    assert db.collection("menu").reads - reads == 1
+    assert store.version == 2
+
+def test_soft_delete_removes_item():
+    db, store = make_store(synthetic_menu(20))
+    db.touch("item-5", deleted=True)
+    items = names(store)
+    assert "item-5" not in items
+    assert len(items) == 19
+
+def test_hard_delete_seen_by_full_reload():
+    db, store = make_store(synthetic_menu(20), full_reload_interval=3600)
+    del db.documents["item-7"]
+    assert "item-7" in names(store)
+    store.full_reload_interval = 0
+    assert "item-7" not in names(store)
+
+def test_unchanged_reload_keeps_version():
+    db, store = make_store(synthetic_menu(20), full_reload_interval=0)
+    snapshot = store.items()
+    assert store.items() is snapshot
+    assert store.version == 1
+
+def test_documents_without_updated_at_fall_back_to_full_reload(caplog):
+    menu_items = [{key: value for key, value in item.items() if key != "updated_at"} for item in synthetic_menu(10)]
+    with caplog.at_level(logging.WARNING, logger="menu_store"):
+        db, store = make_store(menu_items)
+    assert "no updated_at" in caplog.text
+    db.documents["item-2"]["name"] = "Edited Without Timestamp"
+    del db.documents["item-4"]
+    items = names(store)
+    assert items["item-2"] == "Edited Without Timestamp"
+    assert "item-4" not in items
+    assert store.version == 2
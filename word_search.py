@@ -0,0 +1,167 @@
+import queue
+import random
+import string
+import threading
+from collections import namedtuple
+
+FOOD_WORD_SETS = [
+    ["Pizza", "Sushi", "Pasta", "Tacos", "Salad", "Burger", "Soup", "Curry"],
+    ["Noodle", "Rice", "Steak", "Fries", "Cake", "Donut", "Bread", "Tofu"],
+    ["Ramen", "Chili", "Salsa", "Bagel", "Pancake", "Waffle", "Pie", "Kebab"],
+    ["Lasagna", "Sandwich", "Omelet", "Wrap", "Smoothie", "Muffin", "Scone", "Fish"],
+    ["Quinoa", "Tart", "Crepe", "Bacon", "Sorbet", "Gyoza", "Shrimp", "Rice"]
+]
+
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (0, -1), (-1, 0), (-1, -1), (1, -1), (-1, 1)]
+
+# grid: rows of letters; words: as shown to the player; positions: (WORD, [(row, col), ...]) per word
+Puzzle = namedtuple("Puzzle", ["grid", "words", "positions"])
+
+def _cells(start_row, start_col, direction, length):
+    dr, dc = direction
+    return [(start_row + i * dr, start_col + i * dc) for i in range(length)]
+
+# Every in-bounds placement of a word of this length, in random order
+def _placements(size, length, rng):
+    placements = []
+    for dr, dc in DIRECTIONS:
+        rows = range(size) if dr == 0 else range(length - 1, size) if dr < 0 else range(size - length + 1)
+        cols = range(size) if dc == 0 else range(length - 1, size) if dc < 0 else range(size - length + 1)
+        placements.extend(_cells(r, c, (dr, dc), length) for r in rows for c in cols)
+    rng.shuffle(placements)
+    return placements
+
+# Place every word by backtracking over all placements (longest words first, overlaps only on matching
+# letters), so generation succeeds whenever the words fit at all. Returns (grid, word_positions).
+def generate_word_search(size=10, words=None, rng=None):
+    if not words:
+        return None, None
+    rng = rng or random.Random()
+    upper = [word.upper() for word in words]
+    too_long = [word for word in upper if len(word) > size]
+    if too_long:
+        raise ValueError(f"Words longer than the {size}x{size} grid: {', '.join(too_long)}")
+    order = sorted(range(len(upper)), key=lambda i: -len(upper[i]))
+    letters = {}
+    placed = [None] * len(upper)
+
+    def place(k):
+        if k == len(order):
+            return True
+        word = upper[order[k]]
+        for cells in _placements(size, len(word), rng):
+            if any(letters.get(cell, letter) != letter for cell, letter in zip(cells, word)):
+                continue
+            added = [cell for cell in cells if cell not in letters]
+            for cell, letter in zip(cells, word):
+                letters[cell] = letter
+            placed[order[k]] = cells
+            if place(k + 1):
+                return True
+            for cell in added:
+                del letters[cell]
+        return False
+
+    if not place(0):
+        raise ValueError("These words cannot all be placed in the grid")
+    grid = [[letters.get((r, c)) or rng.choice(string.ascii_uppercase) for c in range(size)] for r in range(size)]
+    return grid, [(word, cells) for word, cells in zip(upper, placed)]
+
+def make_puzzle(size=10, word_sets=FOOD_WORD_SETS, rng=None):
+    rng = rng or random.Random()
+    words = list(dict.fromkeys(rng.choice(word_sets)))
+    grid, positions = generate_word_search(size, words, rng)
+    return Puzzle(grid, words, positions)
+
+# Process-wide stock of ready puzzles, refilled on a background thread from a seeded generator,
+# so starting a game never waits on generation
+class PuzzlePool:
+    def __init__(self, size=10, word_sets=FOOD_WORD_SETS, capacity=8, seed=None):
+        self.size = size
+        self.word_sets = word_sets
+        self._rng = random.Random(seed)
+        self._ready = queue.Queue(maxsize=capacity)
+        self._wanted = threading.Event()
+        self._wanted.set()
+        threading.Thread(target=self._fill, name="puzzle-pool", daemon=True).start()
+
+    def _fill(self):
+        while True:
+            self._wanted.wait()
+            try:
+                self._ready.put_nowait(make_puzzle(self.size, self.word_sets, self._rng))
+            except queue.Full:
+                self._wanted.clear()
+
+    def take(self):
+        try:
+            puzzle = self._ready.get_nowait()
+        except queue.Empty:
+            puzzle = make_puzzle(self.size, self.word_sets, random.Random())
+        self._wanted.set()
+        return puzzle
+
+# One player's game. A word -> cells index and the found/selected/hint cell sets make each cell's
+# state, and checking the current selection, constant work per cell.
+class WordSearchGame:
+    def __init__(self, puzzle):
+        self.grid = puzzle.grid
+        self.words = puzzle.words
+        self.positions = puzzle.positions
+        self.word_cells = {word: cells for word, cells in puzzle.positions}
+        self.found_words = set()
+        self.found_cells = set()
+        self.selected_cells = set()
+        self.hint_cells = set()
+        self.stars = 0
+
+    def cell_state(self, cell):
+        if cell in self.found_cells:
+            return "found"
+        if cell in self.hint_cells:
+            return "hint"
+        if cell in self.selected_cells:
+            return "selected"
+        return None
+
+    def toggle(self, cell):
+        if cell in self.selected_cells:
+            self.selected_cells.remove(cell)
+        else:
+            self.selected_cells.add(cell)
+
+    # The hidden word spelled by the selection, if the selected cells form a straight evenly spaced line
+    def selected_word(self):
+        selected = sorted(self.selected_cells)
+        if len(selected) < 2:
+            return None
+        dr = selected[1][0] - selected[0][0]
+        dc = selected[1][1] - selected[0][1]
+        if any(b[0] - a[0] != dr or b[1] - a[1] != dc for a, b in zip(selected, selected[1:])):
+            return None
+        word = "".join(self.grid[r][c] for r, c in selected)
+        if word in self.word_cells:
+            return word
+        return word[::-1] if word[::-1] in self.word_cells else None
+
+    # Mark the selected word as found; returns True when this selection found a new word
+    def check_word_formed(self):
+        word = self.selected_word()
+        if word is None or word in self.found_words:
+            return False
+        self.found_words.add(word)
+        self.found_cells.update(self.word_cells[word])
+        self.selected_cells.clear()
+        return True
+
+    def is_found(self, word):
+        return word.upper() in self.found_words
+
+    # Reveal one random cell of a word not yet found
+    def hint(self, rng=random):
+        unfound = [word for word, _ in self.positions if word not in self.found_words]
+        if not unfound:
+            return None
+        cell = rng.choice(self.word_cells[rng.choice(unfound)])
+        self.hint_cells.add(cell)
+        return cell